@@ -1,4 +1,5 @@
 from .client import *
+from .async_client import AsyncVehicleClient, AsyncMultirotorClient
 from .utils import *
 from .types import *
 
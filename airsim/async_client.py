@@ -0,0 +1,286 @@
+from __future__ import print_function
+
+from .utils import *
+from .types import *
+from .client import VehicleClient, MultirotorClient, _unpack_fast, _OutOfData
+
+import asyncio
+import itertools
+import functools
+import msgpack
+import msgpackrpc
+
+_REQUEST = 0
+_RESPONSE = 1
+
+
+class _BlockingCallProxy:
+    """
+    Stand-in for msgpackrpc.Client used to run the synchronous client methods from
+    a worker thread: each call is dispatched on the async connection and the
+    thread blocks until its response arrives.
+    """
+    def __init__(self, async_client, loop):
+        self._async_client = async_client
+        self._loop = loop
+
+    def call(self, method, *args):
+        return asyncio.run_coroutine_threadsafe(self._async_client.call(method, *args), self._loop).result()
+
+    def call_async(self, method, *args):
+        return self.call(method, *args)
+
+
+class AsyncVehicleClient:
+    """
+    asyncio client for the AirSim msgpack-rpc server.
+
+    All requests share a single TCP connection and are matched to their responses
+    by message id, so any number of them can be in flight at once. Methods ending
+    in `Async` send the request immediately and return an `asyncio.Future`; await it
+    to wait for the command to finish, or drop it to fire and forget. Every other
+    method is a coroutine.
+
+    Methods of the synchronous client that are not implemented natively here are
+    still available: they run in a worker thread on top of this same connection.
+
+    Example:
+        async with AsyncMultirotorClient() as client:
+            images, state = await asyncio.gather(client.simGetImages(requests), client.getMultirotorState())
+    """
+    _sync_class = VehicleClient
+
+    def __init__(self, ip = "", port = 41451, timeout_value = 3600):
+        if (ip == ""):
+            ip = "127.0.0.1"
+        self.ip = ip
+        self.port = port
+        self.timeout_value = timeout_value
+
+        self._reader = None
+        self._writer = None
+        self._read_task = None
+        self._pending = {}
+        self._fast_msgids = set()
+        self._msgids = itertools.count()
+        self._packer = msgpack.Packer(default = lambda x: x.to_msgpack())
+
+    async def connect(self):
+        self._reader, self._writer = await asyncio.wait_for(
+            asyncio.open_connection(self.ip, self.port), self.timeout_value)
+        self._read_task = asyncio.get_running_loop().create_task(self._read_loop())
+        return self
+
+    async def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except ConnectionError:
+                pass
+        if self._read_task is not None:
+            await asyncio.gather(self._read_task, return_exceptions = True)
+        self._writer = self._reader = self._read_task = None
+
+    async def __aenter__(self):
+        return await self.connect()
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def _read_loop(self):
+        # Messages are framed with _unpack_fast (skip only) so that responses flagged
+        # as `fast_decode` can be decoded with NumPy buffers; the rest use msgpack
+        buffer = bytearray()
+        error = ConnectionError("Connection to AirSim closed")
+        try:
+            while True:
+                data = await self._reader.read(1 << 20)
+                if not data:
+                    break
+                buffer += data
+                start = 0
+                while True:
+                    try:
+                        _, end = _unpack_fast(buffer, start, decode = False)
+                    except _OutOfData:
+                        break
+                    message = bytes(buffer[start:end])
+                    start = end
+                    self._dispatch(self._decode(message))
+                del buffer[:start]
+        except Exception as e:
+            error = e
+        finally:
+            pending, self._pending = self._pending, {}
+            self._fast_msgids.clear()
+            for future in pending.values():
+                if not future.done():
+                    future.set_exception(error)
+
+    def _decode(self, message):
+        # Responses are [1, msgid, error, result]: msgid starts at byte 2
+        if self._fast_msgids:
+            msgid, _ = _unpack_fast(message, 2)
+            if msgid in self._fast_msgids:
+                self._fast_msgids.discard(msgid)
+                return _unpack_fast(message)[0]
+        return msgpack.unpackb(message, raw = False)
+
+    def _dispatch(self, message):
+        if len(message) != 4 or message[0] != _RESPONSE:
+            return
+        _, msgid, error, result = message
+        future = self._pending.pop(msgid, None)
+        if future is None or future.done():
+            return
+        if error is not None:
+            future.set_exception(msgpackrpc.error.RPCError(str(error)))
+        else:
+            future.set_result(result)
+
+    def call_async(self, method, *args, fast_decode = False):
+        """
+        Sends a request without waiting for its response
+
+        Args:
+            fast_decode (bool, optional): Decode the response with NumPy buffers for bin and float arrays
+
+        Returns:
+            asyncio.Future: resolves to the raw msgpack result
+        """
+        if self._writer is None:
+            raise ConnectionError("Client is not connected, call connect() first")
+        msgid = next(self._msgids) & 0xFFFFFFFF
+        future = asyncio.get_running_loop().create_future()
+        self._pending[msgid] = future
+        if fast_decode:
+            self._fast_msgids.add(msgid)
+        self._writer.write(self._packer.pack([_REQUEST, msgid, method, list(args)]))
+        return future
+
+    async def call(self, method, *args, fast_decode = False):
+        future = self.call_async(method, *args, fast_decode = fast_decode)
+        await self._writer.drain()
+        return await asyncio.wait_for(future, self.timeout_value)
+
+    def __getattr__(self, name):
+        # Fallback to the synchronous API, run in a worker thread over this connection
+        method = getattr(self._sync_class, name, None)
+        if name.startswith('_') or not callable(method):
+            raise AttributeError("'%s' object has no attribute '%s'" % (type(self).__name__, name))
+
+        @functools.wraps(method)
+        async def wrapper(*args, **kwargs):
+            sync_client = self._sync_class.__new__(self._sync_class)
+            sync_client.client = _BlockingCallProxy(self, asyncio.get_running_loop())
+            return await asyncio.to_thread(method, sync_client, *args, **kwargs)
+        return wrapper
+
+#----------------------------------- Common vehicle APIs ---------------------------------------------
+    async def reset(self):
+        await self.call('reset')
+
+    async def ping(self):
+        return await self.call('ping')
+
+    async def getServerVersion(self):
+        return await self.call('getServerVersion')
+
+    async def confirmConnection(self):
+        """
+        Checks the connection and reports client/server versions in console
+        """
+        if await self.ping():
+            print("Connected!")
+        else:
+            print("Ping returned false!")
+        server_ver = await self.getServerVersion()
+        client_min_ver = await self.call('getMinRequiredClientVersion')
+        print("Client Ver:1 (Min Req: " + str(client_min_ver) + "), Server Ver:" + str(server_ver) + " (Min Req: 1)")
+        print('')
+
+    async def enableApiControl(self, is_enabled, vehicle_name = ''):
+        await self.call('enableApiControl', is_enabled, vehicle_name)
+
+    async def isApiControlEnabled(self, vehicle_name = ''):
+        return await self.call('isApiControlEnabled', vehicle_name)
+
+    async def armDisarm(self, arm, vehicle_name = ''):
+        return await self.call('armDisarm', arm, vehicle_name)
+
+    async def simGetImage(self, camera_name, image_type, vehicle_name = '', external = False):
+        result = await self.call('simGetImage', str(camera_name), image_type, vehicle_name, external)
+        if (result == "" or result == "\0"):
+            return None
+        return result
+
+    async def simGetImages(self, requests, vehicle_name = '', external = False, fast = False):
+        """
+        Returns:
+            list[ImageResponse]: or list[FastImageResponse] if `fast` is set
+        """
+        responses_raw = await self.call('simGetImages', requests, vehicle_name, external, fast_decode = fast)
+        response_class = FastImageResponse if fast else ImageResponse
+        return [response_class.from_msgpack(response_raw) for response_raw in responses_raw]
+
+    async def simGetVehiclePose(self, vehicle_name = ''):
+        return Pose.from_msgpack(await self.call('simGetVehiclePose', vehicle_name))
+
+    async def simGetCollisionInfo(self, vehicle_name = ''):
+        return CollisionInfo.from_msgpack(await self.call('simGetCollisionInfo', vehicle_name))
+
+    async def cancelLastTask(self, vehicle_name = ''):
+        await self.call('cancelLastTask', vehicle_name)
+
+
+class AsyncMultirotorClient(AsyncVehicleClient):
+    _sync_class = MultirotorClient
+
+    def takeoffAsync(self, timeout_sec = 20, vehicle_name = ''):
+        return self.call_async('takeoff', timeout_sec, vehicle_name)
+
+    def landAsync(self, timeout_sec = 60, vehicle_name = ''):
+        return self.call_async('land', timeout_sec, vehicle_name)
+
+    def goHomeAsync(self, timeout_sec = 3e+38, vehicle_name = ''):
+        return self.call_async('goHome', timeout_sec, vehicle_name)
+
+    def hoverAsync(self, vehicle_name = ''):
+        return self.call_async('hover', vehicle_name)
+
+    def moveByVelocityBodyFrameAsync(self, vx, vy, vz, duration, drivetrain = DrivetrainType.MaxDegreeOfFreedom, yaw_mode = YawMode(), vehicle_name = ''):
+        return self.call_async('moveByVelocityBodyFrame', vx, vy, vz, duration, drivetrain, yaw_mode, vehicle_name)
+
+    def moveByVelocityZBodyFrameAsync(self, vx, vy, z, duration, drivetrain = DrivetrainType.MaxDegreeOfFreedom, yaw_mode = YawMode(), vehicle_name = ''):
+        return self.call_async('moveByVelocityZBodyFrame', vx, vy, z, duration, drivetrain, yaw_mode, vehicle_name)
+
+    def moveByVelocityAsync(self, vx, vy, vz, duration, drivetrain = DrivetrainType.MaxDegreeOfFreedom, yaw_mode = YawMode(), vehicle_name = ''):
+        return self.call_async('moveByVelocity', vx, vy, vz, duration, drivetrain, yaw_mode, vehicle_name)
+
+    def moveByVelocityZAsync(self, vx, vy, z, duration, drivetrain = DrivetrainType.MaxDegreeOfFreedom, yaw_mode = YawMode(), vehicle_name = ''):
+        return self.call_async('moveByVelocityZ', vx, vy, z, duration, drivetrain, yaw_mode, vehicle_name)
+
+    def moveToPositionAsync(self, x, y, z, velocity, timeout_sec = 3e+38, drivetrain = DrivetrainType.MaxDegreeOfFreedom, yaw_mode = YawMode(),
+        lookahead = -1, adaptive_lookahead = 1, vehicle_name = ''):
+        return self.call_async('moveToPosition', x, y, z, velocity, timeout_sec, drivetrain, yaw_mode, lookahead, adaptive_lookahead, vehicle_name)
+
+    def moveToZAsync(self, z, velocity, timeout_sec = 3e+38, yaw_mode = YawMode(), lookahead = -1, adaptive_lookahead = 1, vehicle_name = ''):
+        return self.call_async('moveToZ', z, velocity, timeout_sec, yaw_mode, lookahead, adaptive_lookahead, vehicle_name)
+
+    def rotateToYawAsync(self, yaw, timeout_sec = 3e+38, margin = 5, vehicle_name = ''):
+        return self.call_async('rotateToYaw', yaw, timeout_sec, margin, vehicle_name)
+
+    def rotateByYawRateAsync(self, yaw_rate, duration, vehicle_name = ''):
+        return self.call_async('rotateByYawRate', yaw_rate, duration, vehicle_name)
+
+    async def getMultirotorState(self, vehicle_name = '', fast = False):
+        """
+        Returns:
+            MultirotorState: or FastMultirotorState if `fast` is set
+        """
+        state_class = FastMultirotorState if fast else MultirotorState
+        return state_class.from_msgpack(await self.call('getMultirotorState', vehicle_name))
+
+    async def getRotorStates(self, vehicle_name = ''):
+        return RotorStates.from_msgpack(await self.call('getRotorStates', vehicle_name))
@@ -9,12 +9,175 @@ import msgpack
 import time
 import math
 import logging
+import socket
+import struct
+
+#----------------------------------- NumPy-aware msgpack decoding ---------------------------------------------
+# msgpack unpacks `image_data_float` into a Python list of millions of floats, which
+# list_to_2d_float_array then copies again. This decoder maps homogeneous float arrays
+# straight from the wire into a float32 NumPy buffer (one vectorized strided read) and
+# returns bin payloads as uint8 views. Raises _OutOfData if `buf` is incomplete, so it
+# can also be used to frame messages on a stream.
+
+class _OutOfData(Exception):
+    pass
+
+_FLOAT_ARRAY_MIN_LEN = 16
+_FLOAT_MARKERS = {0xca: (5, '>f4'), 0xcb: (9, '>f8')}
+_SIZED = {
+    0xc4: struct.Struct('>B'), 0xc5: struct.Struct('>H'), 0xc6: struct.Struct('>I'),    # bin
+    0xc7: struct.Struct('>Bb'), 0xc8: struct.Struct('>Hb'), 0xc9: struct.Struct('>Ib'), # ext
+    0xd9: struct.Struct('>B'), 0xda: struct.Struct('>H'), 0xdb: struct.Struct('>I'),    # str
+    0xdc: struct.Struct('>H'), 0xdd: struct.Struct('>I'),                               # array
+    0xde: struct.Struct('>H'), 0xdf: struct.Struct('>I'),                               # map
+}
+_SCALARS = {
+    0xca: struct.Struct('>f'), 0xcb: struct.Struct('>d'),
+    0xcc: struct.Struct('>B'), 0xcd: struct.Struct('>H'), 0xce: struct.Struct('>I'), 0xcf: struct.Struct('>Q'),
+    0xd0: struct.Struct('>b'), 0xd1: struct.Struct('>h'), 0xd2: struct.Struct('>i'), 0xd3: struct.Struct('>q'),
+}
+_FIXEXT_SIZES = {0xd4: 1, 0xd5: 2, 0xd6: 4, 0xd7: 8, 0xd8: 16}
+
+def _read_struct(fmt, buf, offset):
+    end = offset + fmt.size
+    if end > len(buf):
+        raise _OutOfData()
+    return fmt.unpack_from(buf, offset), end
+
+def _unpack_array(buf, offset, count, decode):
+    marker = buf[offset] if (count >= _FLOAT_ARRAY_MIN_LEN and offset < len(buf)) else None
+    if marker in _FLOAT_MARKERS:
+        stride, dtype = _FLOAT_MARKERS[marker]
+        end = offset + count * stride
+        if end > len(buf):
+            raise _OutOfData()
+        markers = np.ndarray((count,), dtype = np.uint8, buffer = buf, offset = offset, strides = (stride,))
+        if (markers == marker).all():
+            if not decode:
+                return None, end
+            values = np.ndarray((count,), dtype = dtype, buffer = buf, offset = offset + 1, strides = (stride,))
+            return values.astype(np.float32), end
+
+    items = [] if decode else None
+    for _ in range(count):
+        item, offset = _unpack_fast(buf, offset, decode)
+        if decode:
+            items.append(item)
+    return items, offset
+
+def _unpack_map(buf, offset, count, decode):
+    items = {} if decode else None
+    for _ in range(count):
+        key, offset = _unpack_fast(buf, offset, decode)
+        value, offset = _unpack_fast(buf, offset, decode)
+        if decode:
+            items[key] = value
+    return items, offset
+
+def _unpack_fast(buf, offset = 0, decode = True):
+    """
+    Decodes one msgpack object from `buf` at `offset`
+
+    Returns:
+        (object, next_offset): object is None when `decode` is False (skip only)
+    """
+    if offset >= len(buf):
+        raise _OutOfData()
+    b = buf[offset]
+    offset += 1
+
+    if b <= 0x7f:
+        return b, offset
+    if b >= 0xe0:
+        return b - 0x100, offset
+    if b <= 0x8f:
+        return _unpack_map(buf, offset, b & 0x0f, decode)
+    if b <= 0x9f:
+        return _unpack_array(buf, offset, b & 0x0f, decode)
+    if b <= 0xbf:
+        length = b & 0x1f
+        end = offset + length
+        if end > len(buf):
+            raise _OutOfData()
+        return (bytes(buf[offset:end]).decode('utf-8') if decode else None), end
+    if b == 0xc0:
+        return None, offset
+    if b == 0xc2:
+        return False, offset
+    if b == 0xc3:
+        return True, offset
+    if b in _SCALARS:
+        (value,), offset = _read_struct(_SCALARS[b], buf, offset)
+        return value, offset
+    if b in _FIXEXT_SIZES:
+        (code,), offset = _read_struct(_SCALARS[0xd0], buf, offset)
+        end = offset + _FIXEXT_SIZES[b]
+        if end > len(buf):
+            raise _OutOfData()
+        return (msgpack.ExtType(code, bytes(buf[offset:end])) if decode else None), end
+    if b in _SIZED:
+        header, offset = _read_struct(_SIZED[b], buf, offset)
+        length = header[0]
+        if b >= 0xdc:
+            return (_unpack_array if b <= 0xdd else _unpack_map)(buf, offset, length, decode)
+        end = offset + length
+        if end > len(buf):
+            raise _OutOfData()
+        if not decode:
+            return None, end
+        if b <= 0xc6:
+            return np.frombuffer(buf, dtype = np.uint8, count = length, offset = offset), end
+        if b <= 0xc9:
+            return msgpack.ExtType(header[1], bytes(buf[offset:end])), end
+        return bytes(buf[offset:end]).decode('utf-8'), end
+    raise ValueError("Invalid msgpack type byte: 0x%02x" % b)
+
+class _NumpyRpcClient:
+    """
+    Minimal blocking msgpack-rpc connection whose responses are decoded with _unpack_fast.
+    Used by the `fast` image path of VehicleClient.
+    """
+    def __init__(self, ip, port, timeout_value):
+        self._sock = socket.create_connection((ip, port), timeout = timeout_value)
+        self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._packer = msgpack.Packer(default = lambda x: x.to_msgpack())
+        self._buffer = bytearray()
+        self._msgid = 0
+
+    def _read_message(self):
+        while True:
+            try:
+                _, end = _unpack_fast(self._buffer, 0, decode = False)
+                message = bytes(self._buffer[:end])
+                del self._buffer[:end]
+                return message
+            except _OutOfData:
+                chunk = self._sock.recv(1 << 20)
+                if not chunk:
+                    raise ConnectionError("Connection to AirSim closed")
+                self._buffer += chunk
+
+    def call(self, method, *args):
+        self._msgid = (self._msgid + 1) & 0xFFFFFFFF
+        self._sock.sendall(self._packer.pack([0, self._msgid, method, list(args)]))
+        while True:
+            _, msgid, error, result = _unpack_fast(self._read_message())[0]
+            if msgid == self._msgid:
+                break
+        if error is not None:
+            raise msgpackrpc.error.RPCError(str(error))
+        return result
+
+    def close(self):
+        self._sock.close()
 
 class VehicleClient:
     def __init__(self, ip = "", port = 41451, timeout_value = 3600):
         if (ip == ""):
             ip = "127.0.0.1"
         self.client = msgpackrpc.Client(msgpackrpc.Address(ip, port), timeout = timeout_value, pack_encoding = 'utf-8', unpack_encoding = 'utf-8')
+        self._rpc_address = (ip, port, timeout_value)
+        self._numpy_client = None
 
 #----------------------------------- Common vehicle APIs ---------------------------------------------
     def reset(self):
@@ -292,7 +455,7 @@ class VehicleClient:
 #camera control
 #simGetImage returns compressed png in array of bytes
 #image_type uses one of the ImageType members
-    def simGetImages(self, requests, vehicle_name = '', external = False):
+    def simGetImages(self, requests, vehicle_name = '', external = False, fast = False):
         """
         Get multiple images
 
@@ -302,10 +465,20 @@ class VehicleClient:
             requests (list[ImageRequest]): Images required
             vehicle_name (str, optional): Name of vehicle associated with the camera
             external (bool, optional): Whether the camera is an External Camera
+            fast (bool, optional): Decode into FastImageResponse, with image data as NumPy arrays.
+                Float images (`pixels_as_float=True`) are decoded straight from the wire into a
+                contiguous float32 buffer, so `list_to_2d_float_array` only reshapes it.
+                Uses a second connection to the server, opened on first use.
 
         Returns:
-            list[ImageResponse]:
+            list[ImageResponse]: or list[FastImageResponse] if `fast` is set
         """
+        if fast:
+            if getattr(self, '_numpy_client', None) is None:
+                self._numpy_client = _NumpyRpcClient(*self._rpc_address)
+            responses_raw = self._numpy_client.call('simGetImages', requests, vehicle_name, external)
+            return [FastImageResponse.from_msgpack(response_raw) for response_raw in responses_raw]
+
         responses_raw = self.client.call('simGetImages', requests, vehicle_name, external)
         return [ImageResponse.from_msgpack(response_raw) for response_raw in responses_raw]
 
@@ -1554,17 +1727,19 @@ class MultirotorClient(VehicleClient, object):
         self.client.call('setPositionControllerGains', *(position_gains.to_lists()+(vehicle_name,)))
 
 #query vehicle state
-    def getMultirotorState(self, vehicle_name = ''):
+    def getMultirotorState(self, vehicle_name = '', fast = False):
         """
         The position inside the returned MultirotorState is in the frame of the vehicle's starting point
 
         Args:
             vehicle_name (str, optional): Vehicle to get the state of
+            fast (bool, optional): Decode into the slotted FastMultirotorState
 
         Returns:
-            MultirotorState:
+            MultirotorState: or FastMultirotorState if `fast` is set
         """
-        return MultirotorState.from_msgpack(self.client.call('getMultirotorState', vehicle_name))
+        state_class = FastMultirotorState if fast else MultirotorState
+        return state_class.from_msgpack(self.client.call('getMultirotorState', vehicle_name))
     getMultirotorState.__annotations__ = {'return': MultirotorState}
 #query rotor states
     def getRotorStates(self, vehicle_name = ''):
@@ -402,6 +402,120 @@ class MultirotorState(MsgpackMixin):
     ready_message = ""
     can_arm = False
 
+#----------------------------------- Fast decoding ---------------------------------------------
+# Hot-path responses (images and multirotor state) decoded straight into __slots__ objects,
+# without the per-response __dict__ rebuild and recursive from_msgpack of MsgpackMixin.
+# Both msgpack maps (MSGPACK_DEFINE_MAP) and arrays (MSGPACK_DEFINE_ARRAY) are accepted.
+
+def _vector3r_from_msgpack(encoded):
+    if isinstance(encoded, dict):
+        return Vector3r(encoded['x_val'], encoded['y_val'], encoded['z_val'])
+    return Vector3r(*encoded)
+
+def _quaternionr_from_msgpack(encoded):
+    if isinstance(encoded, dict):
+        return Quaternionr(encoded['x_val'], encoded['y_val'], encoded['z_val'], encoded['w_val'])
+    w_val, x_val, y_val, z_val = encoded
+    return Quaternionr(x_val, y_val, z_val, w_val)
+
+def _uint8_from_msgpack(encoded):
+    if isinstance(encoded, (bytes, bytearray, memoryview)):
+        return np.frombuffer(encoded, dtype=np.uint8)
+    return np.asarray(encoded if encoded is not None else (), dtype=np.uint8)
+
+def _float32_from_msgpack(encoded):
+    if isinstance(encoded, np.ndarray):
+        return encoded
+    if isinstance(encoded, (bytes, bytearray, memoryview)):
+        return np.frombuffer(encoded, dtype=np.float32)
+    return np.asarray(encoded if encoded is not None else (), dtype=np.float32)
+
+class _SlottedMsgpack:
+    __slots__ = ()
+    # (msgpack key, attribute, decoder or None) in server declaration order
+    _fields = ()
+
+    def __repr__(self):
+        from pprint import pformat
+        return "<" + type(self).__name__ + "> " + pformat({key: getattr(self, attr) for key, attr, _ in self._fields}, indent=4, width=1)
+
+    @classmethod
+    def from_msgpack(cls, encoded):
+        obj = cls.__new__(cls)
+        is_map = isinstance(encoded, dict)
+        for i, (key, attr, decoder) in enumerate(cls._fields):
+            if is_map:
+                value = encoded.get(key)
+            else:
+                value = encoded[i] if i < len(encoded) else None
+            object.__setattr__(obj, attr, decoder(value) if (decoder is not None and value is not None) else value)
+        return obj
+
+def _slots(fields):
+    return tuple(attr for _, attr, _ in fields)
+
+class FastImageResponse(_SlottedMsgpack):
+    """
+    Slotted counterpart of ImageResponse: `image_data_uint8` and `image_data_float` are NumPy arrays
+    """
+    _fields = (('image_data_uint8', 'image_data_uint8', _uint8_from_msgpack),
+               ('image_data_float', 'image_data_float', _float32_from_msgpack),
+               ('camera_position', 'camera_position', _vector3r_from_msgpack),
+               ('camera_name', 'camera_name', None),
+               ('camera_orientation', 'camera_orientation', _quaternionr_from_msgpack),
+               ('time_stamp', 'time_stamp', None),
+               ('message', 'message', None),
+               ('pixels_as_float', 'pixels_as_float', None),
+               ('compress', 'compress', None),
+               ('width', 'width', None),
+               ('height', 'height', None),
+               ('image_type', 'image_type', None))
+    __slots__ = _slots(_fields)
+
+class FastKinematicsState(_SlottedMsgpack):
+    _fields = (('position', 'position', _vector3r_from_msgpack),
+               ('orientation', 'orientation', _quaternionr_from_msgpack),
+               ('linear_velocity', 'linear_velocity', _vector3r_from_msgpack),
+               ('angular_velocity', 'angular_velocity', _vector3r_from_msgpack),
+               ('linear_acceleration', 'linear_acceleration', _vector3r_from_msgpack),
+               ('angular_acceleration', 'angular_acceleration', _vector3r_from_msgpack))
+    __slots__ = _slots(_fields)
+
+class FastMultirotorState(_SlottedMsgpack):
+    """
+    Slotted counterpart of MultirotorState. `collision`, `gps_location` and `rc_data` are only
+    decoded when accessed, since the control loop rarely needs them.
+    """
+    _fields = (('collision', '_collision', None),
+               ('kinematics_estimated', 'kinematics_estimated', FastKinematicsState.from_msgpack),
+               ('gps_location', '_gps_location', None),
+               ('timestamp', 'timestamp', None),
+               ('landed_state', 'landed_state', None),
+               ('rc_data', '_rc_data', None),
+               ('ready', 'ready', None),
+               ('ready_message', 'ready_message', None),
+               ('can_arm', 'can_arm', None))
+    __slots__ = _slots(_fields)
+
+    def _lazy(self, attr, cls):
+        value = getattr(self, attr)
+        if isinstance(value, dict):
+            value = cls.from_msgpack(value)
+            object.__setattr__(self, attr, value)
+        return value
+
+    @property
+    def collision(self):
+        return self._lazy('_collision', CollisionInfo)
+
+    @property
+    def gps_location(self):
+        return self._lazy('_gps_location', GeoPoint)
+
+    @property
+    def rc_data(self):
+        return self._lazy('_rc_data', RCData)
+
 class RotorStates(MsgpackMixin):
     timestamp = np.uint64(0)
     rotors = []
@@ -1,14 +1,23 @@
-import numpy as np
 from pid import PID
+from sectors import sector_stats
+from roi_distance import PartitionEstimator
 
 # Distancias de seguridad
 FOLLOW_DIST = 3.0
 MAX_SPEED = 10.0
 SAFE_DIST = 3.0  # Si hay algo a menos de 3m en el centro, iniciamos evasión
 
+# Submuestreo entero de la imagen de profundidad antes de evaluar los sectores
+# (1 = resolución completa, 2 = 1/4 de los píxeles, ...)
+AVOID_DOWNSAMPLE = 1
+
+# Distancia al objetivo = percentil 10 de la profundidad en su bbox
+ROI_PERCENTILE = 10
+ROI_STRIDE = 1  # Submuestreo del recorte (1 = todos los píxeles)
+
 
 class DroneController:
-    def __init__(self):
+    def __init__(self, roi_estimator=None):
         # PID DISTANCIA (Controla Velocidad Frontal - VX)
         self.pid_distance = PID(Kp=0.8, Ki=0.01, Kd=0.5,
                                 output_limits=(-MAX_SPEED, MAX_SPEED))
@@ -17,32 +26,27 @@ class DroneController:
         self.pid_center = PID(Kp=0.15, Ki=0.001, Kd=0.05,
                               output_limits=(-30, 30))
 
+        # ESTIMADOR DE DISTANCIA EN LA BBOX (intercambiable, p. ej. HistogramEstimator)
+        self.roi_estimator = roi_estimator or PartitionEstimator(q=ROI_PERCENTILE, stride=ROI_STRIDE)
+
     # ---------------------------------------------------------
     # EVITACIÓN DE OBSTÁCULOS (Lógica de los 3 Sectores)
     # ---------------------------------------------------------
     def avoid_obstacles(self, depth):
-        h, w = depth.shape
-
         # 1. DIVIDIR LA VISIÓN EN 3 SECTORES
-        # Recortamos franjas verticales de la imagen de profundidad
+        # Franjas verticales de la imagen de profundidad, evaluadas en una sola pasada
         # [  IZQUIERDA  |   CENTRO   |   DERECHA  ]
-        slice_w = w // 3
-
-        strip_left   = depth[:, :slice_w]
-        strip_center = depth[:, slice_w:2*slice_w]
-        strip_right  = depth[:, 2*slice_w:]
+        stats = sector_stats(depth, n_sectors=3, downsample=AVOID_DOWNSAMPLE)
 
         # 2. CALCULAR "PUNTUACIÓN" DE CADA SECTOR
         # Usamos la media para saber qué tan "abierto" está el camino.
         # Mayor valor = Más espacio libre (lejos).
-        # Nota: Si el array está vacío (error de cámara), asumimos 0.
-        score_left   = np.mean(strip_left)   if strip_left.size > 0 else 0
-        score_center = np.mean(strip_center) if strip_center.size > 0 else 0
-        score_right  = np.mean(strip_right)  if strip_right.size > 0 else 0
+        # Nota: Si la imagen está vacía (error de cámara), sector_stats devuelve 0.
+        score_left, score_center, score_right = stats.mean
 
         # Para seguridad inmediata, miramos el punto más CERCANO del centro
         # (Para no chocarnos con una farola fina que la media no detecte)
-        min_dist_center = np.min(strip_center) if strip_center.size > 0 else 0
+        min_dist_center = stats.min[1]
 
         # 3. TOMAR DECISIÓN
         vx = 4.0        # Velocidad de crucero por defecto
@@ -92,7 +96,7 @@ class DroneController:
         if x2 > x1 and y2 > y1:
             crop = depth[y1:y2, x1:x2]
             if crop.size > 0:
-                distance = float(np.percentile(crop, 10))
+                distance = self.roi_estimator(crop)
 
         error_dist = distance - FOLLOW_DIST
         vx = self.pid_distance.update(error_dist, dt)
@@ -1,8 +1,8 @@
 import sys
 import asyncio
 import time
-import base64
-import json
+import threading
+from pathlib import Path
 import numpy as np
 import cv2
 import zmq
@@ -13,11 +13,22 @@ if sys.platform == 'win32' and sys.version_info >= (3, 8):
 
 import airsim
 from controller import DroneController
+from tracker import BoxTracker
+from pipeline import LatestValue, FrameHistory, RateGovernor, StageThread, StageStats, format_stats
+
+# Protocolo de frames compartido con yolo_detector.py (src/utils)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "utils"))
+from frame_protocol import send_frame, send_shm_frame, detection_topic, recv_detections, send_subscription
+from codec import PROFILES
+from shm_ring import SharedFrameRing
 
 # --- CONFIGURACIÓN ---
 TARGET_CLASS = 1    # Ambulancia
-FLIGHT_ALTITUDE = -2.5
+FLIGHT_ALTITUDE = -2.5  # NED (negativo = arriba). TILED_MODE del detector solo tesela por encima de 10 m
 CAMERA_NAME = "0"
+SOURCE_ID = "dron0"  # Identificador ante el detector (único si varios drones comparten YOLO)
+AIRSIM_IP = "127.0.0.1"
+AIRSIM_PORT = 41451
 
 # Factor de suavizado (0.0 a 1.0).
 # 0.2 = Muy suave (lento en reaccionar)
@@ -25,6 +36,47 @@ CAMERA_NAME = "0"
 # 0.4 = Balanceado
 ALPHA = 0.4
 
+# Suscripción registrada en el detector: solo llegan estas detecciones
+# (varias por frame para que el tracker no confunda objetivos cercanos)
+MIN_CONFIDENCE = 0.25
+DETECTION_TOP_K = 5
+SUBSCRIPTION_INTERVAL = 1.0  # Reenvío periódico por si el detector se reinicia
+
+# Cada detección trae el frame_id de su imagen: con el instante de captura de ese
+# frame (guardado en un anillo) se actualiza el tracker, que extrapola la caja a
+# cada tick de control. Las pistas sin detección durante MAX_DETECTION_AGE se borran
+FRAME_HISTORY = 32          # Instantes de captura recientes guardados
+MAX_DETECTION_AGE = 0.5     # Segundos desde la captura del último frame detectado
+DETECT_EVERY = 2            # Se envía a YOLO como mucho 1 de cada k frames capturados; el tracker cubre el resto
+
+# Modo ROI: mientras se sigue un objetivo solo se envía un recorte a su alrededor
+# (con margen); cada ROI_REFRESH envíos va un frame completo para no perder contexto
+ROI_MODE = True
+ROI_MARGIN = 1.0     # Margen a cada lado, en múltiplos del tamaño de la caja
+ROI_MIN_SIZE = 128   # Lado mínimo del recorte en píxeles
+ROI_REFRESH = 10
+
+# Regulador de envío: ritmo, calidad JPEG y escala según la latencia del detector
+ADAPTIVE_RATE = True
+MAX_DETECTION_LATENCY = 0.3  # Segundos captura -> detección antes de bajar calidad/escala
+
+# Transporte de imágenes hacia YOLO: perfil de codec.PROFILES
+# "quality" / "balanced" / "fast" / "gray" = JPEG (red), de más calidad a menos latencia
+# "lz4" / "raw" = sin pérdidas (loopback, poco o ningún coste de codificación)
+CODEC_PROFILE = "balanced"
+
+# "tcp" = imagen dentro del mensaje ZMQ
+# "shm" = imagen en memoria compartida (YOLO en la misma máquina), por ZMQ solo va el slot
+TRANSPORT = "tcp"
+SHM_NAME = "dron_frames"
+SHM_SLOTS = 8
+
+# Bucle en etapas: captura, publicación y estado corren en hilos propios;
+# el control se ejecuta a frecuencia fija con el dato más reciente de cada una
+CONTROL_HZ = 50
+STATE_HZ = 100
+STATS_INTERVAL = 2.0  # Segundos entre informes de tiempos por etapa
+
 
 def body_to_world(vx_body, vy_body, yaw_rad):
     vx_world = (vx_body * np.cos(yaw_rad)) - (vy_body * np.sin(yaw_rad))
@@ -32,23 +84,66 @@ def body_to_world(vx_body, vy_body, yaw_rad):
     return vx_world, vy_world
 
 
-def main():
+def decode_rgb(img_resp):
+    """Convierte la respuesta Scene de AirSim en una imagen BGR (vista, sin copia)."""
+    img1d = np.frombuffer(img_resp.image_data_uint8, dtype=np.uint8)
+    pixels = img_resp.width * img_resp.height
+
+    if img1d.size == pixels * 3:
+        return img1d.reshape(img_resp.height, img_resp.width, 3)
+    if img1d.size == pixels * 4:
+        return img1d.reshape(img_resp.height, img_resp.width, 4)[:, :, :3]
+    return None
+
+
+def roi_around(box, shape):
+    """
+    Recorte [x0, y0, x1, y1] (enteros, dentro de la imagen) alrededor de la caja
+    con ROI_MARGIN, o None si la caja ya ha salido de la imagen.
+    """
+    h, w = shape[:2]
+    x1, y1, x2, y2 = box
+    half_w = max((x2 - x1) * (0.5 + ROI_MARGIN), ROI_MIN_SIZE / 2)
+    half_h = max((y2 - y1) * (0.5 + ROI_MARGIN), ROI_MIN_SIZE / 2)
+    cx, cy = (x1 + x2) / 2, (y1 + y2) / 2
+    x0, x1 = int(max(0, cx - half_w)), int(min(w, cx + half_w))
+    y0, y1 = int(max(0, cy - half_h)), int(min(h, cy + half_h))
+    if x1 - x0 < ROI_MIN_SIZE / 4 or y1 - y0 < ROI_MIN_SIZE / 4:
+        return None
+    return x0, y0, x1, y1
+
+
+def main(duration=None):
+    """
+    Vuelo autónomo. Con `duration` (segundos) el bucle de control termina solo
+    (benchmarks); por defecto corre hasta CTRL+C.
+    """
     # --- INICIALIZACIÓN ---
     print("[INIT] Configurando ZeroMQ...")
     context = zmq.Context()
     socket_pub_img = context.socket(zmq.PUB)
+    socket_pub_img.setsockopt(zmq.SNDHWM, 2)  # No acumular frames viejos si YOLO va lento
     socket_pub_img.bind("tcp://*:5556")
 
     socket_sub_det = context.socket(zmq.SUB)
     socket_sub_det.connect("tcp://localhost:5555")
-    socket_sub_det.setsockopt_string(zmq.SUBSCRIBE, "")
+    socket_sub_det.setsockopt(zmq.SUBSCRIBE, detection_topic(SOURCE_ID))  # Solo nuestras detecciones
+
+    socket_push_ctrl = context.socket(zmq.PUSH)
+    socket_push_ctrl.setsockopt(zmq.SNDHWM, 1)
+    socket_push_ctrl.setsockopt(zmq.LINGER, 0)
+    socket_push_ctrl.connect("tcp://localhost:5557")
 
     print("[INIT] Conectando a AirSim...")
-    client = airsim.MultirotorClient(ip="127.0.0.1", port=41451, timeout_value=5)
+    client = airsim.MultirotorClient(ip=AIRSIM_IP, port=AIRSIM_PORT, timeout_value=5)
     client.confirmConnection()
     client.enableApiControl(True)
     client.armDisarm(True)
 
+    # El cliente msgpack-rpc no es thread-safe: una conexión por hilo
+    capture_client = airsim.MultirotorClient(ip=AIRSIM_IP, port=AIRSIM_PORT, timeout_value=5)
+    state_client = airsim.MultirotorClient(ip=AIRSIM_IP, port=AIRSIM_PORT, timeout_value=5)
+
     print("[DRON] Despegando...")
     client.takeoffAsync().join()
     client.moveToZAsync(FLIGHT_ALTITUDE, 1).join()
@@ -56,53 +151,157 @@ def main():
     controller = DroneController()
     print("[DRON] Vuelo fluido iniciado. CTRL+C para salir.")
 
+    # Buzones entre etapas (siempre el dato más reciente)
+    latest_capture = LatestValue()  # (frame_id, img_bgr, depth)
+    latest_yaw = LatestValue()      # yaw en radianes
+    latest_altitude = LatestValue() # metros sobre el origen (positivo hacia arriba)
+    latest_target = LatestValue()   # caja seguida (extrapolada) o None
+    capture_times = FrameHistory(FRAME_HISTORY)  # frame_id -> t_captura
+
+    governor = RateGovernor(MAX_DETECTION_LATENCY)
+    stop_event = threading.Event()
+    pipeline_state = {"frame_id": 0, "ring": None, "published": 0, "sent": 0,
+                      "last_sent_id": -DETECT_EVERY}
+
+    image_requests = [
+        airsim.ImageRequest(CAMERA_NAME, airsim.ImageType.Scene, False, False),
+        airsim.ImageRequest(CAMERA_NAME, airsim.ImageType.DepthPlanar, True)
+    ]
+
+    # --- ETAPA 1: Captura (RGB + Depth) ---
+    def capture_step():
+        responses = capture_client.simGetImages(image_requests, fast=True)
+        if len(responses) < 2:
+            return
+
+        img_bgr = decode_rgb(responses[0])
+        if img_bgr is None:
+            return
+
+        depth_resp = responses[1]
+        depth = airsim.list_to_2d_float_array(depth_resp.image_data_float, depth_resp.width, depth_resp.height)
+
+        pipeline_state["frame_id"] += 1
+        capture_times.put(pipeline_state["frame_id"], time.time())
+        latest_capture.put((pipeline_state["frame_id"], img_bgr, depth))
+
+    # --- ETAPA 2: Codificación y envío a YOLO ---
+    def publish_step():
+        capture, version = latest_capture.wait_newer(pipeline_state["published"], timeout=0.1)
+        if capture is None:
+            return
+        pipeline_state["published"] = version
+        frame_id, img_bgr, _ = capture
+        # Frames capturados desde el último envío (no frame_id % k: esta etapa se salta
+        # capturas y el regulador descarta envíos, así que el módulo dejaría huecos irregulares)
+        if frame_id - pipeline_state["last_sent_id"] < DETECT_EVERY:
+            return
+
+        now = time.time()
+        if ADAPTIVE_RATE:
+            if not governor.ready(now):
+                return
+            governor.sent(now)
+        pipeline_state["last_sent_id"] = frame_id
+
+        if TRANSPORT == "shm" and pipeline_state["ring"] is None:
+            pipeline_state["ring"] = SharedFrameRing.create(SHM_NAME, SHM_SLOTS, img_bgr.nbytes)
+            print(f"[INIT] Memoria compartida '{SHM_NAME}': {SHM_SLOTS} slots de {pipeline_state['ring'].slot_bytes} bytes")
+
+        # Las cajas vuelven siempre en coordenadas de la imagen completa (orig_shape / crop)
+        codec_args, extra = dict(PROFILES[CODEC_PROFILE]), {}
+        pipeline_state["sent"] += 1
+        target_box = latest_target.get()
+        roi = None
+        if ROI_MODE and target_box is not None and pipeline_state["sent"] % ROI_REFRESH:
+            roi = roi_around(target_box, img_bgr.shape)
+
+        if roi is not None:
+            # Siguiendo: solo un recorte alrededor del objetivo, a resolución nativa
+            x0, y0, x1, y1 = roi
+            extra["orig_shape"] = list(img_bgr.shape)
+            extra["crop"] = [x0, y0, x1, y1]
+            img_bgr = img_bgr[y0:y1, x0:x1]
+        elif ADAPTIVE_RATE:
+            if "quality" in codec_args:
+                codec_args["quality"] = min(codec_args["quality"], governor.quality)
+            if governor.scale < 1.0:
+                extra["orig_shape"] = list(img_bgr.shape)
+                img_bgr = cv2.resize(img_bgr, None, fx=governor.scale, fy=governor.scale,
+                                     interpolation=cv2.INTER_AREA)
+
+        # La altitud permite al detector ajustar el teselado a objetos pequeños
+        altitude = latest_altitude.get()
+
+        if TRANSPORT == "shm":
+            send_shm_frame(socket_pub_img, pipeline_state["ring"], img_bgr, frame_id, source=SOURCE_ID,
+                           altitude=altitude, **extra)
+        else:
+            send_frame(socket_pub_img, img_bgr, frame_id, source=SOURCE_ID, altitude=altitude,
+                       **codec_args, **extra)
+
+    # --- ETAPA 3: Estado del dron (yaw y altitud) ---
+    def state_step():
+        state = state_client.getMultirotorState(fast=True)
+        kinematics = state.kinematics_estimated
+        latest_yaw.put(airsim.to_eularian_angles(kinematics.orientation)[2])
+        latest_altitude.put(-kinematics.position.z_val)  # NED: z negativo hacia arriba
+
+    stages = [
+        StageThread("captura", capture_step, stop_event),
+        StageThread("envio", publish_step, stop_event),
+        StageThread("estado", state_step, stop_event, period=1.0 / STATE_HZ),
+    ]
+    control_stats = StageStats("control")
+    for stage in stages:
+        stage.start()
+
     last_time = time.time()
+    last_report = last_time
+    last_subscription = 0.0
+    deadline = last_time + duration if duration is not None else None
 
     # Variables para el suavizado de movimiento (Memoria del frame anterior)
     smooth_vx = 0.0
     smooth_vy = 0.0
 
+    # Pistas de los objetos detectados y la que se está siguiendo
+    tracker = BoxTracker(max_age=MAX_DETECTION_AGE)
+    target_id = None
+
     try:
-        while True:
+        # --- ETAPA 4: Control (hilo principal, frecuencia fija) ---
+        while not stop_event.is_set() and (deadline is None or time.time() < deadline):
+            tick_start = time.perf_counter()
+
             # Calculamos dt
             now = time.time()
             dt = now - last_time
             last_time = now
 
-            # --- 1. Obtener Imagen y Enviar a YOLO ---
-            responses = client.simGetImages([
-                airsim.ImageRequest(CAMERA_NAME, airsim.ImageType.Scene, False, False),
-                airsim.ImageRequest(CAMERA_NAME, airsim.ImageType.DepthPlanar, True)
-            ])
-
-            if len(responses) < 2: continue
-
-            # Proceso RGB (YOLO)
-            img_resp = responses[0]
-            img1d = np.frombuffer(img_resp.image_data_uint8, dtype=np.uint8)
-            pixels = img_resp.width * img_resp.height
-            
-            if img1d.size == pixels * 3:
-                img_bgr = img1d.reshape(img_resp.height, img_resp.width, 3)
-            elif img1d.size == pixels * 4:
-                img_bgr = img1d.reshape(img_resp.height, img_resp.width, 4)[:, :, :3]
-            else:
+            # --- 1. Datos más recientes de captura y estado ---
+            capture = latest_capture.get()
+            yaw = latest_yaw.get()
+            if capture is None or yaw is None:
+                stop_event.wait(1.0 / CONTROL_HZ)
                 continue
-
-            _, buffer = cv2.imencode('.jpg', img_bgr, [int(cv2.IMWRITE_JPEG_QUALITY), 80])
-            jpg_as_text = base64.b64encode(buffer).decode('utf-8')
-            socket_pub_img.send_json({"image": jpg_as_text, "timestamp": time.time()})
-
-            # Proceso Depth
-            depth_resp = responses[1]
-            depth = airsim.list_to_2d_float_array(depth_resp.image_data_float, depth_resp.width, depth_resp.height)
+            _, _, depth = capture
 
             # --- 2. Recibir Detecciones ---
-            detections = []
+            if now - last_subscription >= SUBSCRIPTION_INTERVAL:
+                last_subscription = now
+                send_subscription(socket_push_ctrl, SOURCE_ID, classes=[TARGET_CLASS],
+                                  min_conf=MIN_CONFIDENCE, top_k=DETECTION_TOP_K)
+
             try:
                 while True:
-                    msg = socket_sub_det.recv_json(flags=zmq.NOBLOCK)
-                    detections = msg["detections"]
+                    det_header, detections = recv_detections(socket_sub_det, flags=zmq.NOBLOCK)
+                    captured_at = capture_times.get(det_header["frame_id"])
+                    if captured_at is None:
+                        continue  # Frame fuera del anillo: demasiado antiguo
+                    tracker.update(detections.xyxy, detections.conf, detections.cls, captured_at)
+                    governor.report(det_header.get("service_ms"), det_header.get("skipped", 0),
+                                    now - captured_at)
             except zmq.Again:
                 pass
 
@@ -110,17 +309,14 @@ def main():
             target_vx = 0
             target_yaw_rate = 0
             
-            target_box = None
-            if detections:
-                valid_dets = [d for d in detections if d['class'] == TARGET_CLASS]
-                if valid_dets:
-                    target_box = max(valid_dets, key=lambda x: x['confidence'])
+            # Caja del objetivo extrapolada a este tick (empareja con la profundidad actual)
+            target_id, target_box = tracker.best(TARGET_CLASS, now, prefer_id=target_id)
+            latest_target.put(target_box)
 
-            if target_box:
+            if target_box is not None:
                 # MODO SEGUIMIENTO
-                bbox = target_box['bbox']
                 # Nota: Ahora follow_target devuelve (vx, yaw_rate, dist)
-                target_vx, target_yaw_rate, dist = controller.follow_target(bbox, depth, dt)
+                target_vx, target_yaw_rate, dist = controller.follow_target(target_box, depth, dt)
                 print(f"[FOLLOW] Dist: {dist:.1f}m | VX: {target_vx:.1f} | YawRate: {target_yaw_rate:.1f}")
             else:
                 # MODO BÚSQUEDA
@@ -134,9 +330,6 @@ def main():
             # smooth_vy ya no se usa porque vy siempre será 0
 
             # --- 5. Aplicar Movimiento ---
-            state = client.getMultirotorState()
-            yaw = airsim.to_eularian_angles(state.kinematics_estimated.orientation)[2]
-            
             # CAMBIO CLAVE: vy_body es 0. El dron vuela "recto" hacia donde mira.
             vy_body = 0 
             vx_world, vy_world = body_to_world(smooth_vx, vy_body, yaw)
@@ -150,8 +343,15 @@ def main():
                 # Aquí aplicamos el giro calculado por el PID
                 yaw_mode=airsim.YawMode(is_rate=True, yaw_or_rate=target_yaw_rate)
             )
-            
-            time.sleep(0.01)
+
+            # --- 6. Tiempos por etapa ---
+            elapsed = time.perf_counter() - tick_start
+            control_stats.record(elapsed)
+            if now - last_report >= STATS_INTERVAL:
+                last_report = now
+                print(f"[PIPELINE] {format_stats([stage.stats for stage in stages] + [control_stats, governor])}")
+
+            stop_event.wait(max(0.0, 1.0 / CONTROL_HZ - elapsed))
 
     except KeyboardInterrupt:
         print("\n[SALIDA] ¡Ctrl+C detectado! Aterrizando...")
@@ -161,6 +361,10 @@ def main():
 
     finally:
         print("[SALIDA] Limpiando recursos...")
+        stop_event.set()
+        for stage in stages:
+            stage.join(timeout=2.0)
+
         try:
             # Frenar antes de salir
             client.moveByVelocityAsync(0, 0, 0, 1).join()
@@ -170,7 +374,10 @@ def main():
 
         socket_pub_img.close()
         socket_sub_det.close()
+        socket_push_ctrl.close()
         context.term()
+        if pipeline_state["ring"] is not None:
+            pipeline_state["ring"].close()
         print("[SALIDA] Listo.")
 
 
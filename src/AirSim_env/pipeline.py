@@ -0,0 +1,213 @@
+"""
+Utilidades para el bucle de control en etapas (dron_autonomo.py)
+
+Cada etapa (captura, publicación, estado, control) corre en su propio hilo y se
+comunica con las demás mediante LatestValue: una "cola" de tamaño 1 que siempre
+guarda el dato más reciente. Así el control nunca espera a la E/S de imágenes.
+
+RateGovernor ajusta el envío de frames a YOLO (ritmo, calidad JPEG y escala)
+según la latencia que el propio detector informa en cada respuesta.
+
+FrameHistory guarda además datos de los últimos frames por frame_id, para
+emparejar una detección (que llega con retraso) con el frame en que se hizo.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class LatestValue:
+    """Buzón de un solo elemento: put() sobrescribe, get() devuelve el último."""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._value = None
+        self._version = 0
+
+    def put(self, value):
+        with self._cond:
+            self._value = value
+            self._version += 1
+            self._cond.notify_all()
+
+    def get(self):
+        """Último valor (o None) sin bloquear."""
+        with self._cond:
+            return self._value
+
+    def wait_newer(self, version, timeout=None):
+        """
+        Espera a que haya un valor más nuevo que `version`.
+        Devuelve (valor, versión) o (None, version) si vence el timeout.
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._version > version, timeout):
+                return None, version
+            return self._value, self._version
+
+
+class FrameHistory:
+    """Anillo de los últimos `size` frames indexados por frame_id (thread-safe)."""
+
+    def __init__(self, size):
+        self.size = size
+        self._lock = threading.Lock()
+        self._frames = OrderedDict()
+
+    def put(self, frame_id, value):
+        with self._lock:
+            self._frames[frame_id] = value
+            while len(self._frames) > self.size:
+                self._frames.popitem(last=False)
+
+    def get(self, frame_id):
+        """Valor guardado para `frame_id`, o None si ya salió del anillo."""
+        with self._lock:
+            return self._frames.get(frame_id)
+
+
+class RateGovernor:
+    """
+    Regula el envío de frames al detector a partir de sus respuestas:
+
+    - Ritmo: intervalo mínimo entre envíos = tiempo de servicio del detector
+      (media móvil) por `headroom`. Si el detector descarta frames ("skipped"),
+      el intervalo se alarga; si no, se acerca poco a poco al tiempo de servicio.
+    - Calidad: si la latencia total (captura -> detección) supera `max_latency`
+      varias respuestas seguidas se baja un nivel de LEVELS (calidad JPEG,
+      escala); si queda por debajo de la mitad durante más respuestas, se sube.
+
+    report() se llama desde el hilo de control y ready()/sent() desde el de envío;
+    solo se intercambian floats/ints sueltos, así que no hace falta cerrojo.
+    """
+
+    LEVELS = ((80, 1.0), (65, 1.0), (50, 1.0), (50, 0.75), (40, 0.5))  # (calidad JPEG, escala)
+    SMOOTHING = 0.2
+    BACKOFF = 1.25
+    DEGRADE_AFTER = 3   # Respuestas lentas seguidas antes de bajar de nivel
+    RECOVER_AFTER = 10  # Respuestas holgadas seguidas antes de subir de nivel
+
+    def __init__(self, max_latency=0.3, headroom=1.1):
+        self.max_latency = max_latency
+        self.headroom = headroom
+        self.interval = 0.0
+        self.level = 0
+        self._service = None
+        self._last_sent = 0.0
+        self._slow = 0
+        self._calm = 0
+
+    @property
+    def quality(self):
+        return self.LEVELS[self.level][0]
+
+    @property
+    def scale(self):
+        return self.LEVELS[self.level][1]
+
+    def ready(self, now):
+        return now - self._last_sent >= self.interval
+
+    def sent(self, now):
+        self._last_sent = now
+
+    def report(self, service_ms, skipped, latency):
+        """Respuesta del detector: servicio por frame (ms), frames descartados y latencia total (s)."""
+        if service_ms is not None:
+            service = service_ms / 1000
+            self._service = service if self._service is None else (
+                self.SMOOTHING * service + (1 - self.SMOOTHING) * self._service)
+
+            target = self._service * self.headroom
+            if skipped:
+                self.interval = max(self.interval, target) * self.BACKOFF
+            else:
+                self.interval = max(target, self.interval * (1 - self.SMOOTHING))
+
+        if latency > self.max_latency:
+            self._slow, self._calm = self._slow + 1, 0
+            if self._slow >= self.DEGRADE_AFTER:
+                self.level = min(self.level + 1, len(self.LEVELS) - 1)
+                self._slow = 0
+        elif latency < self.max_latency / 2:
+            self._slow, self._calm = 0, self._calm + 1
+            if self._calm >= self.RECOVER_AFTER:
+                self.level = max(self.level - 1, 0)
+                self._calm = 0
+        else:
+            self._slow = self._calm = 0
+
+    def __str__(self):
+        hz = 1 / self.interval if self.interval > 0 else float("inf")
+        return f"yolo: <= {hz:.0f} Hz (q{self.quality}, x{self.scale})"
+
+
+class StageStats:
+    """Tiempos de una etapa: duración media/máxima por iteración y Hz conseguidos."""
+
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self._reset(time.perf_counter())
+
+    def _reset(self, now):
+        self._count = 0
+        self._busy = 0.0
+        self._max = 0.0
+        self._since = now
+
+    def record(self, duration):
+        with self._lock:
+            self._count += 1
+            self._busy += duration
+            self._max = max(self._max, duration)
+
+    def snapshot(self):
+        """Devuelve (hz, ms_medio, ms_max) desde el último snapshot y reinicia."""
+        now = time.perf_counter()
+        with self._lock:
+            elapsed = now - self._since
+            hz = self._count / elapsed if elapsed > 0 else 0.0
+            mean_ms = 1000 * self._busy / self._count if self._count else 0.0
+            max_ms = 1000 * self._max
+            self._reset(now)
+        return hz, mean_ms, max_ms
+
+    def __str__(self):
+        hz, mean_ms, max_ms = self.snapshot()
+        return f"{self.name}: {hz:5.1f} Hz ({mean_ms:.1f}/{max_ms:.1f} ms)"
+
+
+class StageThread(threading.Thread):
+    """
+    Ejecuta `step()` en bucle hasta que se active `stop_event`, midiendo cada
+    iteración. Si `period` > 0 la etapa se limita a esa frecuencia.
+    """
+
+    def __init__(self, name, step, stop_event, period=0.0):
+        super().__init__(name=name, daemon=True)
+        self.step = step
+        self.stop_event = stop_event
+        self.period = period
+        self.stats = StageStats(name)
+        self.error = None
+
+    def run(self):
+        while not self.stop_event.is_set():
+            start = time.perf_counter()
+            try:
+                self.step()
+            except Exception as e:
+                self.error = e
+                print(f"[ERROR] Etapa {self.name}: {e}")
+                self.stop_event.set()
+                break
+            elapsed = time.perf_counter() - start
+            self.stats.record(elapsed)
+            if self.period > elapsed:
+                self.stop_event.wait(self.period - elapsed)
+
+
+def format_stats(stages):
+    return " | ".join(str(s) for s in stages)
@@ -0,0 +1,136 @@
+"""
+Seguimiento de cajas entre llamadas a YOLO (dron_autonomo.py)
+
+Cada objeto detectado se convierte en una pista con identificador propio y un
+filtro de Kalman de velocidad constante sobre (cx, cy, w, h). Las detecciones
+nuevas se asocian a las pistas por IoU (misma clase) y, entre detecciones, la
+caja se extrapola al instante pedido. Así el control tiene una caja en cada
+tick aunque YOLO solo procese uno de cada k frames.
+"""
+
+import itertools
+
+import numpy as np
+
+IOU_THRESHOLD = 0.3     # IoU mínima para asociar detección y pista
+MAX_TRACK_AGE = 0.5     # Segundos sin detección antes de borrar una pista
+
+# Ruido del filtro (en píxeles): proceso sobre la velocidad, medida sobre la caja
+PROCESS_NOISE = 200.0
+MEASUREMENT_NOISE = 4.0
+
+
+def iou_matrix(a, b):
+    """IoU entre todas las cajas de a (N, 4) y b (M, 4), en formato xyxy."""
+    lt = np.maximum(a[:, None, :2], b[None, :, :2])
+    rb = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = np.prod(np.clip(rb - lt, 0, None), axis=2)
+    area_a = np.prod(a[:, 2:] - a[:, :2], axis=1)
+    area_b = np.prod(b[:, 2:] - b[:, :2], axis=1)
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-9)
+
+
+def _xyxy_to_z(box):
+    x1, y1, x2, y2 = box
+    return np.array([(x1 + x2) / 2, (y1 + y2) / 2, x2 - x1, y2 - y1])
+
+
+def _z_to_xyxy(z):
+    cx, cy, w, h = z
+    return np.array([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], dtype=np.float32)
+
+
+class Track:
+    """Pista de un objeto: Kalman de velocidad constante sobre (cx, cy, w, h)."""
+
+    _H = np.hstack([np.eye(4), np.zeros((4, 4))])
+    _R = np.eye(4) * MEASUREMENT_NOISE ** 2
+
+    def __init__(self, track_id, box, conf, cls, t):
+        self.id = track_id
+        self.cls = cls
+        self.conf = conf
+        self.hits = 1
+        self.t = t            # Instante del estado
+        self.last_seen = t    # Instante de la última detección asociada
+
+        self.x = np.concatenate([_xyxy_to_z(box), np.zeros(4)])
+        self.P = np.diag([MEASUREMENT_NOISE ** 2] * 4 + [PROCESS_NOISE ** 2] * 4)
+
+    def predict(self, t):
+        dt = t - self.t
+        if dt <= 0:
+            return
+        F = np.eye(8)
+        F[:4, 4:] = np.eye(4) * dt
+        Q = np.diag([0.0] * 4 + [(PROCESS_NOISE * dt) ** 2] * 4)
+        self.x = F @ self.x
+        self.P = F @ self.P @ F.T + Q
+        self.t = t
+
+    def update(self, box, conf, t):
+        self.predict(t)
+        y = _xyxy_to_z(box) - self._H @ self.x
+        S = self._H @ self.P @ self._H.T + self._R
+        K = self.P @ self._H.T @ np.linalg.inv(S)
+        self.x = self.x + K @ y
+        self.P = (np.eye(8) - K @ self._H) @ self.P
+        self.conf = conf
+        self.hits += 1
+        self.last_seen = max(self.last_seen, t)
+
+    def box_at(self, t):
+        """Caja xyxy extrapolada a `t` sin modificar el estado."""
+        z = self.x[:4] + self.x[4:] * max(0.0, t - self.t)
+        z[2:] = np.maximum(z[2:], 1.0)
+        return _z_to_xyxy(z)
+
+
+class BoxTracker:
+    def __init__(self, iou_threshold=IOU_THRESHOLD, max_age=MAX_TRACK_AGE):
+        self.iou_threshold = iou_threshold
+        self.max_age = max_age
+        self.tracks = []
+        self._ids = itertools.count(1)
+
+    def update(self, xyxy, conf, cls, t):
+        """Incorpora las detecciones de un frame capturado en `t`."""
+        if self.tracks and len(conf):
+            predicted = np.stack([track.box_at(t) for track in self.tracks])
+            iou = iou_matrix(predicted, xyxy)
+            iou[np.array([track.cls for track in self.tracks])[:, None] != cls[None, :]] = 0.0
+
+            # Asociación voraz: pares de mayor IoU primero
+            matched_tracks, matched_dets = set(), set()
+            for ti, di in zip(*np.unravel_index(np.argsort(iou, axis=None)[::-1], iou.shape)):
+                if iou[ti, di] < self.iou_threshold:
+                    break
+                if ti in matched_tracks or di in matched_dets:
+                    continue
+                self.tracks[ti].update(xyxy[di], float(conf[di]), t)
+                matched_tracks.add(ti)
+                matched_dets.add(di)
+            new = [di for di in range(len(conf)) if di not in matched_dets]
+        else:
+            new = range(len(conf))
+
+        for di in new:
+            self.tracks.append(Track(next(self._ids), xyxy[di], float(conf[di]), int(cls[di]), t))
+        self.prune(t)
+
+    def prune(self, now):
+        self.tracks = [track for track in self.tracks if now - track.last_seen <= self.max_age]
+
+    def best(self, cls, now, prefer_id=None):
+        """
+        Pista de clase `cls` a seguir: `prefer_id` si sigue viva (evita saltar entre
+        objetos), si no la de mayor confianza. Devuelve (id, caja en `now`) o (None, None).
+        """
+        self.prune(now)
+        candidates = [track for track in self.tracks if track.cls == cls]
+        if not candidates:
+            return None, None
+        track = next((t for t in candidates if t.id == prefer_id), None)
+        if track is None:
+            track = max(candidates, key=lambda t: t.conf)
+        return track.id, track.box_at(now)
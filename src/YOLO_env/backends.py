@@ -0,0 +1,206 @@
+"""
+Backends de inferencia para yolo_detector.py
+
+Todos se usan igual que un modelo de Ultralytics:
+    results = backend(frames, classes=[...], conf=0.25)
+    results[i].boxes.xyxy / .conf / .cls
+
+Con shrink=True un lote de imágenes pequeñas (recortes) se infiere a su tamaño
+(múltiplo de 32) en lugar de ampliarlo a imgsz; los modelos se exportan con
+entrada dinámica para admitirlo.
+
+- "ultralytics": PyTorch (GPU si hay), el camino original.
+- "onnx":        ONNX Runtime en CPU.
+- "openvino":    OpenVINO en CPU (lo más rápido en equipos Intel sin GPU).
+
+Los dos últimos trabajan sobre el modelo exportado desde los pesos .pt (se
+exporta la primera vez y se reutiliza) y hacen su propio NMS en NumPy. Todos
+comparten el preprocesado de preprocess.py (letterbox + normalización sobre
+tensores preasignados).
+"""
+
+from collections import namedtuple
+from pathlib import Path
+
+import numpy as np
+
+from preprocess import Letterbox, unletterbox, MAX_BATCH
+
+# Resultado con la misma forma que ultralytics (results[i].boxes.xyxy...)
+Boxes = namedtuple("Boxes", ["xyxy", "conf", "cls"])
+Result = namedtuple("Result", ["boxes"])
+
+IOU_THRESHOLD = 0.45
+MAX_DETECTIONS = 300
+
+
+def _to_numpy(values):
+    # Tensores de torch (posiblemente en GPU) o arrays de NumPy
+    return values.cpu().numpy() if hasattr(values, "cpu") else np.asarray(values)
+
+
+def boxes_to_numpy(boxes):
+    """
+    Extrae (xyxy, conf, cls) de un ultralytics Boxes (o de Boxes de este módulo)
+    con una copia al host por columna, en lugar de convertir caja a caja.
+    """
+    return _to_numpy(boxes.xyxy), _to_numpy(boxes.conf), _to_numpy(boxes.cls)
+
+
+def nms(boxes, scores, iou_threshold=IOU_THRESHOLD):
+    """NMS voraz: índices de las cajas conservadas, ordenados por score."""
+    x1, y1, x2, y2 = boxes.T
+    areas = (x2 - x1) * (y2 - y1)
+    order = np.argsort(scores)[::-1]
+
+    keep = []
+    while order.size:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        w = np.clip(np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]), 0, None)
+        h = np.clip(np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]), 0, None)
+        inter = w * h
+        iou = inter / (areas[i] + areas[rest] - inter + 1e-9)
+        order = rest[iou <= iou_threshold]
+    return np.asarray(keep, dtype=np.intp)
+
+
+def postprocess(pred, transform, shape, classes=None, conf=0.25):
+    """
+    Salida cruda de YOLO11 para una imagen, (4 + nc, N) con cajas cx, cy, w, h en
+    píxeles del letterbox, a Boxes en píxeles de la imagen original.
+    """
+    scores = pred[4:]
+    cls = scores.argmax(axis=0)
+    best = np.take_along_axis(scores, cls[None], axis=0)[0]
+
+    keep = best >= conf
+    if classes is not None:
+        keep &= np.isin(cls, classes)
+    cx, cy, w, h = pred[:4, keep]
+    best, cls = best[keep], cls[keep]
+
+    xyxy = np.stack([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], axis=1)
+    # NMS por clase en una sola pasada: desplazamos cada clase a su propia zona
+    idx = nms(xyxy + cls[:, None] * 4096.0, best)[:MAX_DETECTIONS]
+    xyxy, best, cls = xyxy[idx], best[idx], cls[idx]
+
+    unletterbox(xyxy, transform, shape)
+    return Result(Boxes(xyxy.astype(np.float32), best.astype(np.float32), cls.astype(np.float32)))
+
+
+def export_model(weights, fmt, imgsz):
+    """
+    Exporta los pesos .pt a `fmt` ("onnx" / "openvino") junto a ellos, solo si no
+    existe ya la exportación. Devuelve la ruta exportada.
+    """
+    weights = Path(weights)
+    target = weights.with_suffix(".onnx") if fmt == "onnx" else weights.parent / f"{weights.stem}_openvino_model"
+    if target.exists():
+        return target
+
+    from ultralytics import YOLO
+
+    print(f"[YOLO] Exportando {weights.name} a {fmt} (imgsz={imgsz})...")
+    return Path(YOLO(str(weights)).export(format=fmt, imgsz=imgsz, dynamic=True))
+
+
+class UltralyticsBackend:
+    name = "ultralytics"
+
+    def __init__(self, weights, imgsz=640, device=None, max_batch=MAX_BATCH):
+        import torch
+        from ultralytics import YOLO
+
+        self._torch = torch
+        self.imgsz = imgsz
+        self.device = device
+        self.letterbox = Letterbox(imgsz, max_batch)
+        self.model = YOLO(str(weights))
+
+    def __call__(self, frames, classes=None, conf=0.25, shrink=False, **kwargs):
+        # Con un tensor ya preparado Ultralytics se salta su letterbox/normalizado;
+        # torch.from_numpy comparte memoria con el buffer preasignado
+        tensor, transforms = self.letterbox(frames, shrink)
+        results = self.model(self._torch.from_numpy(tensor), classes=classes, conf=conf, device=self.device,
+                             verbose=False)
+
+        outputs = []
+        for r, transform, frame in zip(results, transforms, frames):
+            boxes = r.boxes
+            xyxy = unletterbox(boxes.xyxy.cpu().numpy(), transform, frame.shape)
+            outputs.append(Result(Boxes(xyxy, boxes.conf.cpu().numpy(), boxes.cls.cpu().numpy())))
+        return outputs
+
+    def warmup(self):
+        self([np.zeros((self.imgsz, self.imgsz, 3), dtype=np.uint8)])
+
+
+class _ExportedBackend:
+    """Base de los backends sobre modelo exportado: letterbox, inferencia del lote y NMS."""
+    name = None
+
+    def __init__(self, weights, imgsz=640, max_batch=MAX_BATCH):
+        self.imgsz = imgsz
+        self.letterbox = Letterbox(imgsz, max_batch)
+        self._load(export_model(weights, self.name, imgsz))
+
+    def _load(self, path):
+        raise NotImplementedError
+
+    def _infer(self, tensor):
+        """Tensor (B, 3, imgsz, imgsz) -> salida (B, 4 + nc, N)."""
+        raise NotImplementedError
+
+    def __call__(self, frames, classes=None, conf=0.25, shrink=False, **kwargs):
+        tensor, transforms = self.letterbox(frames, shrink)
+        pred = self._infer(tensor)
+        return [postprocess(p, t, f.shape, classes, conf) for p, t, f in zip(pred, transforms, frames)]
+
+    def warmup(self):
+        self([np.zeros((self.imgsz, self.imgsz, 3), dtype=np.uint8)])
+
+
+class OnnxBackend(_ExportedBackend):
+    name = "onnx"
+
+    def _load(self, path):
+        import onnxruntime as ort
+
+        self.session = ort.InferenceSession(str(path), providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def _infer(self, tensor):
+        return self.session.run(None, {self.input_name: tensor})[0]
+
+
+class OpenVinoBackend(_ExportedBackend):
+    name = "openvino"
+
+    def _load(self, path):
+        import openvino as ov
+
+        xml = next(Path(path).glob("*.xml"))
+        self.compiled = ov.Core().compile_model(str(xml), "CPU", {"PERFORMANCE_HINT": "LATENCY"})
+        self.output = self.compiled.output(0)
+
+    def _infer(self, tensor):
+        return self.compiled(tensor)[self.output]
+
+
+BACKENDS = {
+    UltralyticsBackend.name: UltralyticsBackend,
+    OnnxBackend.name: OnnxBackend,
+    OpenVinoBackend.name: OpenVinoBackend,
+}
+
+
+def load_backend(name, weights, imgsz=640, warmup=True):
+    """Crea el backend `name` sobre los pesos `weights` y lo calienta con un frame vacío."""
+    if name not in BACKENDS:
+        raise ValueError(f"Backend desconocido: {name} (disponibles: {', '.join(BACKENDS)})")
+    backend = BACKENDS[name](weights, imgsz)
+    if warmup:
+        backend.warmup()
+    return backend
@@ -0,0 +1,103 @@
+"""
+Preprocesado de frames para los backends de inferencia (backends.py)
+
+Letterbox es dueño de los buffers de entrada: un lienzo uint8 (imgsz, imgsz, 3)
+y un tensor NCHW float32 (max_batch, 3, imgsz, imgsz) que se reutilizan en cada
+frame (también para entradas más pequeñas, como vistas sobre el mismo buffer). El resize escribe directamente sobre el lienzo y la normalización
+(BGR -> RGB, HWC -> CHW, /255) directamente sobre el tensor, de modo que en
+régimen estable no se reserva memoria por frame.
+"""
+
+import cv2
+import numpy as np
+
+PAD_VALUE = 114     # Gris de relleno del letterbox (el de Ultralytics)
+MAX_BATCH = 8       # Tamaño inicial de lote del tensor preasignado
+STRIDE = 32         # Los lados de entrada del modelo deben ser múltiplos del stride
+
+
+class Letterbox:
+    """
+    Redimensiona manteniendo la proporción y rellena hasta (size, size),
+    escribiendo en un tensor NCHW float32 preasignado. Devuelve la escala y el
+    desplazamiento para deshacer la transformación en las cajas (unletterbox).
+
+    size es imgsz, salvo con `shrink=True` si todo el lote es más pequeño (p. ej.
+    recortes alrededor del objetivo): entonces se usa el múltiplo de 32 que lo
+    contiene, sin ampliar, y la inferencia es proporcionalmente más barata. Los
+    tensores de cada tamaño son vistas sobre los mismos buffers.
+    """
+
+    def __init__(self, imgsz, max_batch=MAX_BATCH):
+        self.imgsz = imgsz
+        self._tensor_buf = np.empty(max_batch * 3 * imgsz * imgsz, dtype=np.float32)
+        self._canvas_buf = np.empty(imgsz * imgsz * 3, dtype=np.uint8)
+        self._size = None
+        self._shrink = False
+        self._geometry = None
+
+    def _input_size(self, frames, shrink):
+        if not shrink:
+            return self.imgsz
+        side = max(max(frame.shape[:2]) for frame in frames)
+        return min(self.imgsz, -(-side // STRIDE) * STRIDE)
+
+    def _set_size(self, size, shrink):
+        # Lienzo (size, size, 3) y su vista RGB CHW: la normalización lee de aquí sin copias
+        self._canvas = self._canvas_buf[:size * size * 3].reshape(size, size, 3)
+        self._canvas_chw = self._canvas[..., ::-1].transpose(2, 0, 1)
+        self._size = size
+        self._shrink = shrink
+        self._geometry = None
+
+    def _fit(self, shape):
+        h, w = shape[:2]
+        scale = min(self._size / h, self._size / w)
+        if self._shrink:
+            scale = min(scale, 1.0)  # Recortes a resolución nativa
+        new_w, new_h = round(w * scale), round(h * scale)
+        pad_x, pad_y = (self._size - new_w) // 2, (self._size - new_h) // 2
+        return scale, new_w, new_h, pad_x, pad_y
+
+    def __call__(self, frames, shrink=False):
+        """Prepara el tensor del lote y devuelve (tensor, [(escala, pad_x, pad_y), ...])."""
+        size = self._input_size(frames, shrink)
+        if size != self._size or shrink != self._shrink:
+            self._set_size(size, shrink)
+
+        n = len(frames) * 3 * size * size
+        if n > self._tensor_buf.size:
+            # Lote mayor de lo previsto (p. ej. teselas): se amplía una vez y se conserva
+            self._tensor_buf = np.empty(n, dtype=np.float32)
+        tensor = self._tensor_buf[:n].reshape(len(frames), 3, size, size)
+
+        transforms = []
+        for i, frame in enumerate(frames):
+            geometry = self._fit(frame.shape)
+            scale, new_w, new_h, pad_x, pad_y = geometry
+            if geometry != self._geometry:
+                # Cambió el tamaño de entrada: se repinta el relleno una sola vez
+                self._canvas[:] = PAD_VALUE
+                self._geometry = geometry
+
+            # Resize directo sobre la zona útil del lienzo (sin imagen intermedia)
+            roi = self._canvas[pad_y:pad_y + new_h, pad_x:pad_x + new_w]
+            if frame.shape[:2] == roi.shape[:2]:
+                roi[:] = frame
+            else:
+                cv2.resize(frame, (new_w, new_h), dst=roi, interpolation=cv2.INTER_LINEAR)
+
+            # BGR HWC uint8 -> RGB CHW float32 [0, 1] en el tensor del lote
+            np.multiply(self._canvas_chw, 1 / 255, out=tensor[i])
+            transforms.append((scale, pad_x, pad_y))
+        return tensor, transforms
+
+
+def unletterbox(xyxy, transform, shape):
+    """Lleva cajas (N, 4) de coordenadas del tensor a la imagen original, en el sitio."""
+    scale, pad_x, pad_y = transform
+    xyxy -= (pad_x, pad_y, pad_x, pad_y)
+    xyxy /= scale
+    np.clip(xyxy[:, 0::2], 0, shape[1], out=xyxy[:, 0::2])
+    np.clip(xyxy[:, 1::2], 0, shape[0], out=xyxy[:, 1::2])
+    return xyxy
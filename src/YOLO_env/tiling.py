@@ -0,0 +1,123 @@
+"""
+Modo por teselas (estilo SAHI) para objetos pequeños en frames de gran altitud
+
+Cada frame se infiere entero y, además, troceado en teselas solapadas; todas las
+imágenes (frames + teselas) van en una única llamada al modelo. Las cajas de
+cada tesela se trasladan al frame y se fusionan con un NMS vectorizado entre
+teselas que usa IoS (intersección / área menor): una caja cortada por el borde de
+una tesela queda contenida en la del frame o la de la tesela vecina.
+
+El tamaño de tesela y el solape dependen de la altitud que publica
+dron_autonomo.py en la cabecera: cuanto más alto, más pequeños los objetos, más
+pequeñas las teselas y menos solape (en píxeles) hace falta para no cortarlos.
+
+La altitud es la del dron sobre el origen (-z en NED), así que solo se tesela si
+vuela por encima de TILE_REF_ALTITUDE: con el FLIGHT_ALTITUDE por defecto de
+dron_autonomo.py (-2.5, es decir 2.5 m) el modo teselas no se activa nunca.
+"""
+
+import numpy as np
+
+from backends import boxes_to_numpy
+
+TILE_REF_ALTITUDE = 10.0    # m sobre el origen: por debajo no se tesela (ver FLIGHT_ALTITUDE)
+TILE_MIN_SIZE = 320         # px: no ampliar más de 2x a imgsz=640
+TILE_OVERLAP = 0.2          # Solape (fracción de la tesela) mientras la tesela escala con la altitud
+TILE_MIN_OVERLAP = 0.05     # Solape mínimo, con la tesela ya en TILE_MIN_SIZE a gran altitud
+MERGE_THRESHOLD = 0.5       # IoS a partir del cual dos cajas de la misma clase se fusionan
+
+
+def tile_size_for_altitude(shape, altitude):
+    """Lado de tesela para la altitud dada, o None si conviene inferir solo el frame entero."""
+    if altitude is None or altitude <= TILE_REF_ALTITUDE:
+        return None
+    side = max(shape[:2])
+    tile = int(max(TILE_MIN_SIZE, side * TILE_REF_ALTITUDE / altitude))
+    return tile if tile < side else None
+
+
+def tile_overlap_for_altitude(shape, tile, altitude):
+    """
+    Solape para la altitud dada. En píxeles es proporcional al tamaño esperado de
+    los objetos (~1/altitud): igual a TILE_OVERLAP mientras la tesela también escala
+    con la altitud, y menor una vez que la tesela se queda en TILE_MIN_SIZE.
+    """
+    overlap_px = TILE_OVERLAP * max(shape[:2]) * TILE_REF_ALTITUDE / altitude
+    return float(min(TILE_OVERLAP, max(TILE_MIN_OVERLAP, overlap_px / tile)))
+
+
+def tile_grid(shape, tile, overlap=TILE_OVERLAP):
+    """Teselas (T, 4) [x0, y0, x1, y1] que cubren el frame con el solape pedido."""
+    h, w = shape[:2]
+    step = max(1, int(tile * (1 - overlap)))
+
+    def starts(size):
+        # Mínimo número de teselas con solape >= overlap, repartidas uniformemente
+        size_tile = min(tile, size)
+        last = size - size_tile
+        n = -(-last // step) + 1
+        return np.linspace(0, last, n).round().astype(int), size_tile
+
+    xs, tw = starts(w)
+    ys, th = starts(h)
+    x0, y0 = np.meshgrid(xs, ys)
+    x0, y0 = x0.ravel(), y0.ravel()
+    return np.stack([x0, y0, x0 + tw, y0 + th], axis=1)
+
+
+def merge_nms(xyxy, conf, cls, threshold=MERGE_THRESHOLD):
+    """
+    NMS rápido (matriz completa, sin bucle en Python): tras ordenar por confianza,
+    una caja se descarta si alguna de mayor confianza y misma clase la solapa por
+    encima de `threshold` (IoS). Devuelve los índices conservados.
+    """
+    order = np.argsort(conf)[::-1]
+    boxes = xyxy[order]
+
+    lt = np.maximum(boxes[:, None, :2], boxes[None, :, :2])
+    rb = np.minimum(boxes[:, None, 2:], boxes[None, :, 2:])
+    inter = np.prod(np.clip(rb - lt, 0, None), axis=2)
+    areas = np.prod(boxes[:, 2:] - boxes[:, :2], axis=1)
+    ios = inter / (np.minimum(areas[:, None], areas[None, :]) + 1e-9)
+
+    same_class = cls[order][:, None] == cls[order][None, :]
+    # Solo cuentan las cajas anteriores (más confianza): triángulo superior estricto
+    suppress = np.triu(same_class & (ios > threshold), k=1).any(axis=0)
+    return order[~suppress]
+
+
+def infer_tiled(model, frames, altitudes, **kwargs):
+    """
+    Inferencia de frames + teselas en una sola llamada. Devuelve, por frame,
+    (xyxy, conf, cls) en coordenadas del frame tras fusionar teselas.
+    """
+    images, owners, offsets = [], [], []
+    for i, (frame, altitude) in enumerate(zip(frames, altitudes)):
+        images.append(frame)
+        owners.append(i)
+        offsets.append((0, 0))
+        tile = tile_size_for_altitude(frame.shape, altitude)
+        if tile is None:
+            continue
+        overlap = tile_overlap_for_altitude(frame.shape, tile, altitude)
+        for x0, y0, x1, y1 in tile_grid(frame.shape, tile, overlap):
+            images.append(frame[y0:y1, x0:x1])
+            owners.append(i)
+            offsets.append((x0, y0))
+
+    results = model(images, verbose=False, **kwargs)
+
+    parts = [[] for _ in frames]
+    for owner, (x0, y0), r in zip(owners, offsets, results):
+        xyxy, conf, cls = boxes_to_numpy(r.boxes)
+        parts[owner].append((xyxy + np.array([x0, y0, x0, y0], dtype=xyxy.dtype), conf, cls))
+
+    merged = []
+    for frame_parts in parts:
+        if len(frame_parts) == 1:
+            merged.append(frame_parts[0])
+            continue
+        xyxy, conf, cls = (np.concatenate(column) for column in zip(*frame_parts))
+        keep = merge_nms(xyxy, conf, cls)
+        merged.append((xyxy[keep], conf[keep], cls[keep]))
+    return merged
@@ -1,11 +1,7 @@
 import zmq
-import cv2
 import numpy as np
-import base64
-import json
 import time
-from ultralytics import YOLO
-import os
+import sys
 from pathlib import Path
 
 # --- CONFIGURACIÓN DE RUTAS ---
@@ -15,73 +11,209 @@ current_path = Path(__file__).resolve()
 project_root = current_path.parent.parent.parent  # Subimos: YOLO_env -> src -> PROYECTO
 model_path = project_root / "models" / "best_AirSim.pt"
 
-# --- ZMQ SETUP ---
-context = zmq.Context()
-
-# RECIBIR Imágenes (Puerto 5556)
-socket_sub = context.socket(zmq.SUB)
-socket_sub.connect("tcp://localhost:5556")
-socket_sub.setsockopt_string(zmq.SUBSCRIBE, "")
-# CONFLATE: Mantener solo el último mensaje en el buffer (Evita lag si YOLO es lento)
-try:
-    socket_sub.setsockopt(zmq.CONFLATE, 1)
-except AttributeError:
-    print("[WARN] zmq.CONFLATE no disponible en esta versión.")
-
-# PUBLICAR Detecciones (Puerto 5555)
-socket_pub = context.socket(zmq.PUB)
-socket_pub.bind("tcp://*:5555")
-
-print(f"[YOLO] Iniciando servicio...")
-print(f" -> Escuchando en :5556")
-print(f" -> Publicando en :5555")
-
-# --- CARGA MODELO ---
-if model_path.exists():
-    print(f"[YOLO] Cargando modelo: {model_path}")
-    model = YOLO(str(model_path))
-else:
+# Backends de inferencia (Ultralytics/ONNX/OpenVINO se importan al cargar el modelo)
+from backends import boxes_to_numpy, load_backend
+from tiling import infer_tiled
+
+# Protocolo de frames compartido con dron_autonomo.py (src/utils)
+sys.path.insert(0, str(project_root / "src" / "utils"))
+from frame_protocol import (recv_latest_per_source, release_frame, send_detections, recv_subscriptions,
+                            DEFAULT_SOURCE)
+
+# --- CONFIGURACIÓN ZMQ ---
+# RECIBIR Imágenes: uno o varios drones/cámaras (cada uno con su "source" en la cabecera)
+IMAGE_ENDPOINTS = ["tcp://localhost:5556"]
+DETECTION_ENDPOINT = "tcp://*:5555"          # PUBLICAR Detecciones
+CONTROL_ENDPOINT = "tcp://*:5557"            # RECIBIR Suscripciones (clases, confianza, top-k)
+
+# --- BACKEND DE INFERENCIA ---
+# "ultralytics" = PyTorch (GPU si hay) | "onnx" = ONNX Runtime CPU | "openvino" = OpenVINO CPU
+BACKEND = "ultralytics"
+IMGSZ = 640
+
+# --- MODO TESELAS (objetos pequeños a gran altitud) ---
+# Cada frame se infiere entero + en teselas solapadas según la altitud de la cabecera
+TILED_MODE = False
+
+# --- MODO LOTE ---
+# Se juntan hasta BATCH_SIZE frames (uno por emisor) o se espera como mucho
+# BATCH_TIMEOUT_MS, y se infiere con una única llamada model([...]).
+# BATCH_SIZE = 1 equivale a procesar siempre el último frame recibido.
+BATCH_SIZE = 1
+BATCH_TIMEOUT_MS = 10
+
+
+def load_model():
+
+    if model_path.exists():
+        print(f"[YOLO] Cargando modelo: {model_path} (backend: {BACKEND}, imgsz={IMGSZ})")
+        # Exporta si hace falta (onnx/openvino) y hace una inferencia de calentamiento
+        return load_backend(BACKEND, model_path, IMGSZ)
+
     print(f"[ALERTA] No se encontró {model_path}. Usando 'yolo11n.pt' para pruebas.")
-    # model = YOLO("yolo11n.pt")
+    # return load_backend(BACKEND, "yolo11n.pt", IMGSZ)
+    return None
+
+
+def to_source_coords(xyxy, header, frame):
+    """
+    Lleva las cajas a coordenadas de la imagen completa del emisor. El frame
+    recibido es la región "crop" [x0, y0, x1, y1] de esa imagen (por defecto,
+    toda: "orig_shape" o "shape"), quizá reducida al enviarla o al decodificarla.
+    """
+    h, w = header.get("orig_shape", header["shape"])[:2]
+    x0, y0, x1, y1 = header.get("crop", (0, 0, w, h))
+    sx, sy = (x1 - x0) / frame.shape[1], (y1 - y0) / frame.shape[0]
+    if sx == 1 and sy == 1 and x0 == 0 and y0 == 0:
+        return xyxy
+    return xyxy * np.array([sx, sy, sx, sy], dtype=np.float32) + np.array([x0, y0, x0, y0], dtype=np.float32)
+
+
+def model_filters(specs):
+    """
+    Argumentos classes=/conf= para el modelo que cubren a todos los emisores del
+    lote: unión de clases y la confianza más baja. Si alguno no filtra, no se pasa.
+    """
+    kwargs = {}
+    if not specs or None in specs:
+        return kwargs
+    if all(spec.get("classes") is not None for spec in specs):
+        kwargs["classes"] = sorted({c for spec in specs for c in spec["classes"]})
+    if all(spec.get("min_conf") is not None for spec in specs):
+        kwargs["conf"] = min(spec["min_conf"] for spec in specs)
+    return kwargs
+
+
+def filter_detections(xyxy, conf, cls, spec):
+    """Aplica la suscripción de un emisor: clases, confianza mínima y top-k por confianza."""
+    if spec is None:
+        return xyxy, conf, cls
+
+    keep = np.ones(len(conf), dtype=bool)
+    if spec.get("classes") is not None:
+        keep &= np.isin(cls, spec["classes"])
+    if spec.get("min_conf") is not None:
+        keep &= conf >= spec["min_conf"]
+    idx = np.flatnonzero(keep)
+
+    top_k = spec.get("top_k")
+    if top_k is not None and idx.size > top_k:
+        idx = idx[np.argsort(conf[idx])[::-1][:top_k]]
+    return xyxy[idx], conf[idx], cls[idx]
+
 
-# --- BUCLE DE INFERENCIA ---
-while True:
+def serve(model, max_frames=None, duration=None, verbose=True):
+    """
+    Bucle de inferencia: recibe frames, ejecuta el modelo y publica detecciones.
+    `max_frames` / `duration` permiten acotar la ejecución (benchmarks); por defecto es infinito.
+    """
+    # --- ZMQ SETUP ---
+    context = zmq.Context()
+
+    socket_sub = context.socket(zmq.SUB)
+    # CONFLATE no admite mensajes multipart: limitamos la cola y nos quedamos
+    # con el último frame de cada emisor (Evita lag si YOLO es lento)
+    socket_sub.setsockopt(zmq.RCVHWM, 2 * len(IMAGE_ENDPOINTS))
+    socket_sub.setsockopt(zmq.RCVTIMEO, 500)  # Para poder comprobar los límites de ejecución
+    for endpoint in IMAGE_ENDPOINTS:
+        socket_sub.connect(endpoint)
+    socket_sub.setsockopt_string(zmq.SUBSCRIBE, "")
+
+    socket_pub = context.socket(zmq.PUB)
+    socket_pub.bind(DETECTION_ENDPOINT)
+
+    socket_ctrl = context.socket(zmq.PULL)
+    socket_ctrl.bind(CONTROL_ENDPOINT)
+    subscriptions = {}  # source -> {"classes", "min_conf", "top_k"}
+
+    print(f"[YOLO] Iniciando servicio...")
+    print(f" -> Escuchando en {', '.join(IMAGE_ENDPOINTS)}")
+    print(f" -> Publicando en {DETECTION_ENDPOINT}")
+    print(f" -> Suscripciones en {CONTROL_ENDPOINT}")
+    if BATCH_SIZE > 1:
+        print(f" -> Modo lote: hasta {BATCH_SIZE} frames / {BATCH_TIMEOUT_MS} ms")
+
+    # --- BUCLE DE INFERENCIA ---
+    frames = 0
+    deadline = time.time() + duration if duration is not None else None
     try:
-        # 1. Esperar imagen (Bloqueante)
-        msg = socket_sub.recv_json()
-
-        # 2. Decodificar JPG Base64 -> Imagen OpenCV
-        jpg_original = base64.b64decode(msg['image'])
-        np_arr = np.frombuffer(jpg_original, dtype=np.uint8)
-        frame = cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
-
-        if frame is None:
-            continue
-
-        # 3. Inferencia YOLO11
-        results = model(frame, verbose=False)
-
-        # 4. Formatear resultados
-        detections = []
-        for r in results:
-            for box in r.boxes:
-                detections.append({
-                    "bbox": box.xyxy[0].tolist(), # [x1, y1, x2, y2]
-                    "confidence": float(box.conf[0]),
-                    "class": int(box.cls[0])
-                })
-
-        # 5. Enviar respuesta
-        response = {
-            "timestamp": time.time(),
-            "detections": detections
-        }
-        socket_pub.send_json(response)
-
-        # Log ligero
-        if detections:
-            print(f"[DETECT] {len(detections)} objeto(s) detectado(s)")
-
-    except Exception as e:
-        print(f"[ERROR] {e}")
-        time.sleep(0.1)
+        while (max_frames is None or frames < max_frames) and (deadline is None or time.time() < deadline):
+            try:
+                # 1. Esperar imágenes (Bloqueante): lote con el último frame de cada emisor
+                # 2. Decodificar cabecera + payload (JPEG, raw o memoria compartida) -> Imagen OpenCV
+                # (los JPEG grandes se decodifican ya reducidos hacia IMGSZ, salvo al teselar)
+                batch = recv_latest_per_source(socket_sub, BATCH_SIZE, BATCH_TIMEOUT_MS,
+                                               min_size=None if TILED_MODE else IMGSZ)
+                batch = [(header, frame) for header, frame in batch if frame is not None]
+
+                if not batch:
+                    continue
+
+                # Con transporte "shm" los frames son vistas sobre slots reclamados: desde aquí
+                # cualquier fallo (también en suscripciones/filtros) debe liberarlos
+                try:
+                    batch_start = time.perf_counter()
+                    recv_subscriptions(socket_ctrl, subscriptions)
+                    sources = [header.get("source", DEFAULT_SOURCE) for header, _ in batch]
+                    specs = [subscriptions.get(source) for source in sources]
+                    filters = model_filters(specs)
+                    if all("crop" in header for header, _ in batch):
+                        filters["shrink"] = True  # Solo recortes: inferir a su tamaño, sin ampliar
+
+                    # 3. Inferencia YOLO11 (una sola llamada para todo el lote)
+                    # classes=/conf= descartan cajas antes de NMS; el resto del filtrado es por emisor
+                    frames_in = [frame for _, frame in batch]
+                    if TILED_MODE:
+                        # Los recortes alrededor del objetivo no se teselan
+                        altitudes = [None if "crop" in header else header.get("altitude") for header, _ in batch]
+                        detections = infer_tiled(model, frames_in, altitudes, **filters)
+                    else:
+                        detections = [boxes_to_numpy(r.boxes) for r in model(frames_in, verbose=False, **filters)]
+                finally:
+                    # False si el emisor sobrescribió el slot durante la inferencia
+                    valid = [release_frame(header) for header, _ in batch]
+
+                # Tiempo de servicio por frame: el emisor ajusta su ritmo y calidad con él
+                service_ms = 1000 * (time.perf_counter() - batch_start) / len(batch)
+
+                # 4. Formatear resultados y 5. enviar cada uno a su emisor (por frame_id)
+                for (header, frame), source, spec, det, ok in zip(batch, sources, specs, detections, valid):
+                    if not ok:
+                        print(f"[WARN] {source}: frame {header['frame_id']} sobrescrito durante la inferencia, descartado")
+                        continue
+                    xyxy, conf, cls = filter_detections(*det, spec)
+                    xyxy = to_source_coords(xyxy, header, frame)
+                    response = {
+                        "frame_id": header["frame_id"],
+                        "timestamp": time.time(),
+                        "service_ms": service_ms,
+                        "skipped": header.get("skipped", 0),
+                    }
+                    send_detections(socket_pub, source, response, xyxy, conf, cls)
+                    frames += 1
+
+                    # Log ligero
+                    if len(conf) and verbose:
+                        print(f"[DETECT] {source}: {len(conf)} objeto(s) detectado(s)")
+
+            except zmq.Again:
+                continue
+
+            except Exception as e:
+                print(f"[ERROR] {e}")
+                time.sleep(0.1)
+    finally:
+        socket_sub.close()
+        socket_pub.close()
+        socket_ctrl.close()
+        context.term()
+
+    return frames
+
+
+def main():
+    serve(load_model())
+
+
+if __name__ == "__main__":
+    main()
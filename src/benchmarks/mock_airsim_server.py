@@ -0,0 +1,346 @@
+"""
+Servidor msgpack-rpc que imita a AirSim para medir rendimiento sin Unreal
+
+Implementa las llamadas que usa el proyecto (simGetImages, getMultirotorState,
+moveByVelocityZ, takeoff, moveToZ, ...) con imágenes RGB y Depth sintéticas de
+resolución configurable. Registra cada comando de movimiento, lo que permite medir
+desde fuera la frecuencia real del bucle de control.
+
+Uso:
+    python src/benchmarks/mock_airsim_server.py --width 640 --height 480
+"""
+
+import argparse
+import asyncio
+import collections
+import math
+import threading
+import time
+
+import msgpack
+import numpy as np
+
+DEFAULT_PORT = 41451
+NUM_VARIANTS = 8  # Frames sintéticos distintos que se alternan
+
+SCENE = 0
+DEPTH_PLANAR = 1
+
+
+class _Packed:
+    """Resultado ya serializado en msgpack (se inserta tal cual en la respuesta)."""
+
+    def __init__(self, data):
+        self.data = data
+
+
+def synthetic_rgb(width, height, variant=0):
+    """Fondo en degradado con un rectángulo (el "objetivo") que se desplaza."""
+    img = np.empty((height, width, 3), dtype=np.uint8)
+    img[:, :, 0] = np.linspace(40, 200, width, dtype=np.uint8)[None, :]
+    img[:, :, 1] = np.linspace(60, 160, height, dtype=np.uint8)[:, None]
+    img[:, :, 2] = 90
+
+    bw, bh = max(1, width // 8), max(1, height // 6)
+    x0 = (variant * width // NUM_VARIANTS) % max(1, width - bw)
+    y0 = height // 2 - bh // 2
+    img[y0:y0 + bh, x0:x0 + bw] = (255, 255, 255)
+    img[y0 + bh // 3:y0 + 2 * bh // 3, x0:x0 + bw] = (0, 0, 220)
+    return img
+
+
+def synthetic_depth(width, height, variant=0):
+    """Profundidad planar (m): suelo cercano abajo, horizonte lejano y obstáculo central alterno."""
+    rows = np.linspace(40.0, 4.0, height, dtype=np.float32)[:, None]
+    depth = np.repeat(rows, width, axis=1)
+    if variant % 2:
+        depth[height // 3:2 * height // 3, 2 * width // 5:3 * width // 5] = 1.5
+    return depth
+
+
+def _pack_float32_array(values):
+    """Serializa un array float32 como array msgpack (0xca + big-endian) de forma vectorizada."""
+    values = np.ascontiguousarray(values, dtype=np.float32).ravel()
+    n = values.size
+    if n < 16:
+        header = bytes([0x90 | n])
+    elif n < 1 << 16:
+        header = b"\xdc" + n.to_bytes(2, "big")
+    else:
+        header = b"\xdd" + n.to_bytes(4, "big")
+
+    packed = np.empty(n, dtype=[("marker", "u1"), ("value", ">f4")])
+    packed["marker"] = 0xca
+    packed["value"] = values
+    return header + packed.tobytes()
+
+
+def _vector3r(x=0.0, y=0.0, z=0.0):
+    return {"x_val": float(x), "y_val": float(y), "z_val": float(z)}
+
+
+def _quaternionr(yaw):
+    return {"w_val": math.cos(yaw / 2), "x_val": 0.0, "y_val": 0.0, "z_val": math.sin(yaw / 2)}
+
+
+class MockAirSim:
+    def __init__(self, width=640, height=480, rpc_delay=0.0):
+        self.width = width
+        self.height = height
+        self.rpc_delay = rpc_delay
+
+        self.position = np.array([0.0, 0.0, 0.0])
+        self.velocity = np.array([0.0, 0.0, 0.0])
+        self.yaw = 0.0
+        self.yaw_rate = 0.0  # grados/s
+        self._last_update = time.perf_counter()
+
+        self.calls = collections.Counter()
+        self.command_times = []  # perf_counter de cada moveByVelocityZ
+        self._frame = 0
+        self._packer = msgpack.Packer(use_single_float=True, use_bin_type=True)
+        self._image_cache = {}
+
+        self.handlers = {
+            "ping": lambda *a: True,
+            "getServerVersion": lambda *a: 1,
+            "getMinRequiredClientVersion": lambda *a: 1,
+            "enableApiControl": lambda *a: None,
+            "isApiControlEnabled": lambda *a: True,
+            "armDisarm": lambda *a: True,
+            "reset": self._reset,
+            "takeoff": self._takeoff,
+            "land": self._land,
+            "hover": self._hover,
+            "cancelLastTask": self._hover,
+            "moveToZ": self._move_to_z,
+            "moveByVelocity": self._move_by_velocity,
+            "moveByVelocityZ": self._move_by_velocity_z,
+            "simGetImages": self._sim_get_images,
+            "getMultirotorState": self._get_multirotor_state,
+            "simGetVehiclePose": self._sim_get_vehicle_pose,
+        }
+
+    # --- Física mínima ---
+    def _integrate(self):
+        now = time.perf_counter()
+        dt = now - self._last_update
+        self._last_update = now
+        self.position += self.velocity * dt
+        self.yaw = (self.yaw + math.radians(self.yaw_rate) * dt + math.pi) % (2 * math.pi) - math.pi
+
+    def _reset(self, *args):
+        self.position[:] = 0
+        self.velocity[:] = 0
+        self.yaw = self.yaw_rate = 0.0
+
+    def _takeoff(self, *args):
+        self.position[2] = -3.0
+        return True
+
+    def _land(self, *args):
+        self.position[2] = 0.0
+        self.velocity[:] = 0
+        return True
+
+    def _hover(self, *args):
+        self._integrate()
+        self.velocity[:] = 0
+        self.yaw_rate = 0.0
+        return True
+
+    def _move_to_z(self, z, *args):
+        self.position[2] = z
+        return True
+
+    def _apply_yaw_mode(self, yaw_mode):
+        if isinstance(yaw_mode, dict) and yaw_mode.get("is_rate", True):
+            self.yaw_rate = float(yaw_mode.get("yaw_or_rate", 0.0))
+
+    def _move_by_velocity(self, vx, vy, vz, duration, drivetrain=0, yaw_mode=None, *args):
+        self._integrate()
+        self.velocity[:] = (vx, vy, vz)
+        self._apply_yaw_mode(yaw_mode)
+        return True
+
+    def _move_by_velocity_z(self, vx, vy, z, duration, drivetrain=0, yaw_mode=None, *args):
+        self._integrate()
+        self.command_times.append(time.perf_counter())
+        self.velocity[:] = (vx, vy, 0.0)
+        self.position[2] = z
+        self._apply_yaw_mode(yaw_mode)
+        return True
+
+    # --- Sensores ---
+    def _image_response(self, image_type, pixels_as_float, variant):
+        key = (image_type, bool(pixels_as_float), variant)
+        cached = self._image_cache.get(key)
+        if cached is not None:
+            return cached
+
+        if image_type == SCENE and not pixels_as_float:
+            uint8_data = self._packer.pack(synthetic_rgb(self.width, self.height, variant).tobytes())
+            float_data = self._packer.pack([])
+        else:
+            uint8_data = self._packer.pack(b"")
+            float_data = _pack_float32_array(synthetic_depth(self.width, self.height, variant))
+
+        fields = [
+            ("image_data_uint8", uint8_data),
+            ("image_data_float", float_data),
+            ("camera_position", self._packer.pack(_vector3r())),
+            ("camera_name", self._packer.pack("0")),
+            ("camera_orientation", self._packer.pack(_quaternionr(0.0))),
+            ("time_stamp", self._packer.pack(0)),
+            ("message", self._packer.pack("")),
+            ("pixels_as_float", self._packer.pack(bool(pixels_as_float))),
+            ("compress", self._packer.pack(False)),
+            ("width", self._packer.pack(self.width)),
+            ("height", self._packer.pack(self.height)),
+            ("image_type", self._packer.pack(image_type)),
+        ]
+        packed = bytes([0x80 | len(fields)]) + b"".join(self._packer.pack(k) + v for k, v in fields)
+        self._image_cache[key] = packed
+        return packed
+
+    def _sim_get_images(self, requests, *args):
+        self._frame += 1
+        variant = self._frame % NUM_VARIANTS
+        parts = []
+        for req in requests:
+            image_type = req.get("image_type", SCENE) if isinstance(req, dict) else req[1]
+            pixels_as_float = req.get("pixels_as_float", False) if isinstance(req, dict) else req[2]
+            parts.append(self._image_response(image_type, pixels_as_float, variant))
+        return _Packed(bytes([0x90 | len(parts)]) + b"".join(parts))
+
+    def _kinematics(self):
+        return {
+            "position": _vector3r(*self.position),
+            "orientation": _quaternionr(self.yaw),
+            "linear_velocity": _vector3r(*self.velocity),
+            "angular_velocity": _vector3r(0.0, 0.0, math.radians(self.yaw_rate)),
+            "linear_acceleration": _vector3r(),
+            "angular_acceleration": _vector3r(),
+        }
+
+    def _get_multirotor_state(self, *args):
+        self._integrate()
+        return {
+            "collision": {"has_collided": False, "normal": _vector3r(), "impact_point": _vector3r(),
+                          "position": _vector3r(), "penetration_depth": 0.0, "time_stamp": 0,
+                          "object_name": "", "object_id": -1},
+            "kinematics_estimated": self._kinematics(),
+            "gps_location": {"latitude": 47.641468, "longitude": -122.140165, "altitude": 122.0},
+            "timestamp": time.time_ns(),
+            "landed_state": 1,
+            "rc_data": {"timestamp": 0, "pitch": 0.0, "roll": 0.0, "throttle": 0.0, "yaw": 0.0,
+                        "switches": 0, "vendor_id": "", "is_initialized": False, "is_valid": False},
+            "ready": True,
+            "ready_message": "",
+            "can_arm": True,
+        }
+
+    def _sim_get_vehicle_pose(self, *args):
+        self._integrate()
+        kin = self._kinematics()
+        return {"position": kin["position"], "orientation": kin["orientation"]}
+
+    # --- RPC ---
+    def handle(self, method, params):
+        self.calls[method] += 1
+        handler = self.handlers.get(method)
+        if handler is None:
+            raise NotImplementedError(f"Método no implementado en el mock: {method}")
+        return handler(*params)
+
+    def pack_response(self, msgid, error, result):
+        head = b"\x94\x01" + self._packer.pack(msgid) + self._packer.pack(error)
+        if isinstance(result, _Packed):
+            return head + result.data
+        return head + self._packer.pack(result)
+
+    async def _serve_connection(self, reader, writer):
+        unpacker = msgpack.Unpacker(raw=False)
+        try:
+            while True:
+                data = await reader.read(1 << 16)
+                if not data:
+                    break
+                unpacker.feed(data)
+                for message in unpacker:
+                    if message[0] != 0:  # Notificaciones: se ignoran
+                        continue
+                    _, msgid, method, params = message
+                    if self.rpc_delay:
+                        await asyncio.sleep(self.rpc_delay)
+                    try:
+                        response = self.pack_response(msgid, None, self.handle(method, params))
+                    except Exception as e:
+                        response = self.pack_response(msgid, str(e), None)
+                    writer.write(response)
+                await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            # Cliente desconectado o servidor parándose
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host="127.0.0.1", port=DEFAULT_PORT, ready=None):
+        server = await asyncio.start_server(self._serve_connection, host, port)
+        if ready is not None:
+            ready(server.sockets[0].getsockname()[1], server)
+        async with server:
+            await server.serve_forever()
+
+
+def start_in_thread(mock, host="127.0.0.1", port=0):
+    """
+    Arranca el mock en un hilo daemon. Devuelve (puerto, stop), donde stop() lo detiene.
+    Con port=0 se elige un puerto libre.
+    """
+    started = threading.Event()
+    info = {}
+
+    def on_ready(actual_port, server):
+        info["port"] = actual_port
+        info["server"] = server
+        info["loop"] = asyncio.get_running_loop()
+        started.set()
+
+    def run():
+        try:
+            asyncio.run(mock.serve(host, port, ready=on_ready))
+        except asyncio.CancelledError:
+            pass
+
+    thread = threading.Thread(target=run, name="mock-airsim", daemon=True)
+    thread.start()
+    if not started.wait(5.0):
+        raise RuntimeError("El mock de AirSim no arrancó")
+
+    def stop():
+        info["loop"].call_soon_threadsafe(info["server"].close)
+        thread.join(timeout=2.0)
+
+    return info["port"], stop
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor AirSim simulado (msgpack-rpc)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=480)
+    parser.add_argument("--rpc-delay-ms", type=float, default=0.0, help="Latencia añadida a cada llamada")
+    args = parser.parse_args()
+
+    mock = MockAirSim(args.width, args.height, rpc_delay=args.rpc_delay_ms / 1000)
+    print(f"[MOCK] AirSim simulado en {args.host}:{args.port} ({args.width}x{args.height}). CTRL+C para salir.")
+    try:
+        asyncio.run(mock.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        print(f"\n[MOCK] Llamadas atendidas: {dict(mock.calls)}")
+
+
+if __name__ == "__main__":
+    main()
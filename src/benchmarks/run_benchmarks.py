@@ -0,0 +1,329 @@
+"""
+Benchmarks del proyecto contra el mock de AirSim (sin Unreal)
+
+Mide ticks/segundo, latencia de cola (p50/p95/p99/max) y asignaciones de memoria de:
+    - controller  : DroneController.avoid_obstacles / follow_target sobre depth sintético
+    - airsim_rpc  : simGetImages + getMultirotorState contra el mock (decodificación normal y fast)
+    - dron        : dron_autonomo.main completo (ticks medidos en el mock por moveByVelocityZ)
+    - yolo_zmq    : bucle ZMQ de yolo_detector.serve con un modelo stub (o uno real con --model)
+
+Los resultados se guardan en JSON para poder comparar ejecuciones:
+    python src/benchmarks/run_benchmarks.py --width 640 --height 480 --output bench.json
+"""
+
+import argparse
+import contextlib
+import gc
+import io
+import json
+import platform
+import sys
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+
+SRC_DIR = Path(__file__).resolve().parent.parent
+PROJECT_ROOT = SRC_DIR.parent
+for path in (PROJECT_ROOT, SRC_DIR / "AirSim_env", SRC_DIR / "YOLO_env", SRC_DIR / "utils", SRC_DIR / "benchmarks"):
+    sys.path.insert(0, str(path))
+
+from mock_airsim_server import MockAirSim, start_in_thread, synthetic_depth, synthetic_rgb
+
+BENCHMARKS = ("controller", "airsim_rpc", "dron", "yolo_zmq")
+
+
+# --- Utilidades de medida ---
+def latency_stats(samples_s):
+    """Resumen de latencias (en ms) a partir de una lista de duraciones en segundos."""
+    if not samples_s:
+        return {"count": 0}
+    ms = np.asarray(samples_s, dtype=np.float64) * 1000
+    return {
+        "count": int(ms.size),
+        "mean_ms": float(ms.mean()),
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p95_ms": float(np.percentile(ms, 95)),
+        "p99_ms": float(np.percentile(ms, 99)),
+        "max_ms": float(ms.max()),
+    }
+
+
+def gc_collections():
+    return sum(s["collections"] for s in gc.get_stats())
+
+
+@contextlib.contextmanager
+def measure_allocations(result):
+    """Pico de memoria trazada (tracemalloc) y colecciones del GC durante el bloque."""
+    gc_before = gc_collections()
+    tracemalloc.start()
+    try:
+        yield
+    finally:
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        result["alloc_peak_kb"] = peak / 1024
+        result["alloc_retained_kb"] = current / 1024
+        result["gc_collections"] = gc_collections() - gc_before
+
+
+def timed_loop(fn, iterations):
+    samples = []
+    start = time.perf_counter()
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - start
+    result = latency_stats(samples)
+    result["ticks_per_s"] = iterations / elapsed if elapsed > 0 else 0.0
+    return result
+
+
+def profile(fn, iterations):
+    """Pasada de tiempos y, aparte, una pasada corta con tracemalloc (que ralentiza)."""
+    result = timed_loop(fn, iterations)
+    alloc = {}
+    with measure_allocations(alloc):
+        for _ in range(max(1, iterations // 10)):
+            fn()
+    result.update(alloc)
+    return result
+
+
+# --- Benchmarks ---
+def bench_controller(args):
+    from controller import DroneController
+
+    controller = DroneController()
+    depths = [synthetic_depth(args.width, args.height, v) for v in range(2)]
+    box = (args.width * 0.35, args.height * 0.3, args.width * 0.65, args.height * 0.7)
+
+    state = {"i": 0}
+
+    def avoid():
+        state["i"] += 1
+        controller.avoid_obstacles(depths[state["i"] % 2])
+
+    def follow():
+        controller.follow_target(box, depths[0], 0.02)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        return {
+            "avoid_obstacles": profile(avoid, args.iterations),
+            "follow_target": profile(follow, args.iterations),
+        }
+
+
+def bench_airsim_rpc(args):
+    import airsim
+
+    mock = MockAirSim(args.width, args.height)
+    port, stop = start_in_thread(mock)
+    try:
+        client = airsim.MultirotorClient(ip="127.0.0.1", port=port, timeout_value=10)
+        requests = [
+            airsim.ImageRequest("0", airsim.ImageType.Scene, False, False),
+            airsim.ImageRequest("0", airsim.ImageType.DepthPlanar, True),
+        ]
+
+        def images(fast):
+            def step():
+                responses = client.simGetImages(requests, fast=fast)
+                depth = responses[1]
+                airsim.list_to_2d_float_array(depth.image_data_float, depth.width, depth.height)
+            return step
+
+        results = {
+            "simGetImages": profile(images(False), args.iterations),
+            "simGetImages_fast": profile(images(True), args.iterations),
+            "getMultirotorState": profile(lambda: client.getMultirotorState(), args.iterations),
+            "getMultirotorState_fast": profile(lambda: client.getMultirotorState(fast=True), args.iterations),
+        }
+    finally:
+        stop()
+    return results
+
+
+def bench_dron(args):
+    import dron_autonomo
+
+    def run(duration, result=None):
+        mock = MockAirSim(args.width, args.height)
+        port, stop = start_in_thread(mock)
+        dron_autonomo.AIRSIM_PORT = port
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                if result is None:
+                    dron_autonomo.main(duration=duration)
+                else:
+                    with measure_allocations(result):
+                        dron_autonomo.main(duration=duration)
+        finally:
+            stop()
+        return mock
+
+    gc_before = gc_collections()
+    mock = run(args.duration)
+    times = np.asarray(mock.command_times)
+    # El último comando es el de frenado al salir
+    intervals = np.diff(times[:-1]).tolist() if times.size > 2 else []
+
+    result = latency_stats(intervals)
+    result["ticks_per_s"] = (times.size - 2) / (times[-2] - times[0]) if times.size > 2 else 0.0
+    result["gc_collections_per_s"] = (gc_collections() - gc_before) / args.duration
+    result["rpc_calls"] = dict(mock.calls)
+
+    alloc = {}
+    run(min(args.duration, 2.0), alloc)
+    result.update(alloc)
+    return {"control_loop": result}
+
+
+class _StubBoxes:
+    """Imita ultralytics Boxes: arrays por columna e iteración caja a caja."""
+
+    def __init__(self, xyxy, conf, cls):
+        self.xyxy = xyxy
+        self.conf = conf
+        self.cls = cls
+
+    def __len__(self):
+        return len(self.conf)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield _StubBoxes(self.xyxy[i:i + 1], self.conf[i:i + 1], self.cls[i:i + 1])
+
+
+class _StubResult:
+    def __init__(self, boxes):
+        self.boxes = boxes
+
+
+class StubModel:
+    """Modelo de coste casi nulo: aísla el coste de transporte y formateo del detector."""
+
+    def __init__(self, num_boxes=20, seed=0):
+        rng = np.random.default_rng(seed)
+        xy = rng.uniform(0, 400, size=(num_boxes, 2)).astype(np.float32)
+        self.boxes = _StubBoxes(np.hstack([xy, xy + 40]), rng.uniform(0.3, 1.0, num_boxes).astype(np.float32),
+                                rng.integers(0, 5, num_boxes).astype(np.float32))
+
+    def __call__(self, frames, **kwargs):
+        frames = frames if isinstance(frames, list) else [frames]
+        return [_StubResult(self.boxes) for _ in frames]
+
+
+def bench_yolo_zmq(args):
+    import zmq
+    import yolo_detector
+    from frame_protocol import send_frame, recv_detections, PROFILES
+
+    if args.model:
+        from backends import load_backend
+        model = load_backend(args.backend, args.model, args.imgsz)
+    else:
+        model = StubModel()
+
+    yolo_detector.IMAGE_ENDPOINTS = ["tcp://localhost:5566"]
+    yolo_detector.DETECTION_ENDPOINT = "tcp://*:5565"
+    yolo_detector.CONTROL_ENDPOINT = "tcp://*:5567"
+
+    context = zmq.Context()
+    pub = context.socket(zmq.PUB)
+    pub.bind("tcp://*:5566")
+    sub = context.socket(zmq.SUB)
+    sub.connect("tcp://localhost:5565")
+    sub.setsockopt_string(zmq.SUBSCRIBE, "")
+    sub.setsockopt(zmq.RCVTIMEO, 1000)
+
+    detector = threading.Thread(
+        target=lambda: yolo_detector.serve(model, duration=args.duration + 3, verbose=False),
+        name="yolo", daemon=True)
+    with contextlib.redirect_stdout(io.StringIO()):
+        detector.start()
+    time.sleep(0.5)  # Dar tiempo a las suscripciones ZMQ
+
+    frame = synthetic_rgb(args.width, args.height)
+    sent = {}
+    latencies = []
+    frame_id = 0
+    deadline = time.perf_counter() + args.duration
+    alloc = {}
+    try:
+        with measure_allocations(alloc):
+            while time.perf_counter() < deadline:
+                frame_id += 1
+                sent[frame_id] = time.perf_counter()
+                send_frame(pub, frame, frame_id, **PROFILES[args.profile])
+                try:
+                    reply, _ = recv_detections(sub)
+                except zmq.Again:
+                    continue
+                t_sent = sent.pop(reply.get("frame_id"), None)
+                if t_sent is not None:
+                    latencies.append(time.perf_counter() - t_sent)
+    finally:
+        pub.close()
+        sub.close()
+        context.term()
+        detector.join(timeout=5.0)
+
+    result = latency_stats(latencies)
+    result["frames_per_s"] = len(latencies) / args.duration
+    result["frames_sent"] = frame_id
+    result["model"] = args.model or "stub"
+    result["backend"] = args.backend if args.model else "stub"
+    result["profile"] = args.profile
+    result.update(alloc)
+    return {"round_trip": result}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks del dron contra el mock de AirSim")
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=480)
+    parser.add_argument("--iterations", type=int, default=200, help="Iteraciones por micro-benchmark")
+    parser.add_argument("--duration", type=float, default=5.0, help="Segundos para los bucles completos")
+    parser.add_argument("--profile", default="balanced", help="Perfil de codec.PROFILES para yolo_zmq")
+    parser.add_argument("--model", default=None, help="Pesos YOLO reales para yolo_zmq (por defecto, stub)")
+    parser.add_argument("--backend", default="ultralytics", help="Backend para --model (ultralytics/onnx/openvino)")
+    parser.add_argument("--imgsz", type=int, default=640, help="Tamaño de entrada del modelo para --model")
+    parser.add_argument("--only", nargs="+", choices=BENCHMARKS, default=list(BENCHMARKS))
+    parser.add_argument("--output", default="bench_results.json")
+    args = parser.parse_args()
+
+    runners = {
+        "controller": bench_controller,
+        "airsim_rpc": bench_airsim_rpc,
+        "dron": bench_dron,
+        "yolo_zmq": bench_yolo_zmq,
+    }
+
+    report = {
+        "timestamp": time.time(),
+        "config": vars(args),
+        "platform": {"python": sys.version.split()[0], "numpy": np.__version__,
+                     "machine": platform.machine(), "system": platform.system()},
+        "results": {},
+    }
+
+    for name in args.only:
+        print(f"[BENCH] {name}...")
+        try:
+            report["results"][name] = runners[name](args)
+        except Exception as e:
+            print(f"[ERROR] {name}: {e}")
+            report["results"][name] = {"error": str(e)}
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"[BENCH] Resultados guardados en {args.output}")
+
+
+if __name__ == "__main__":
+    main()
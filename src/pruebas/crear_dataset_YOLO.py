@@ -3,6 +3,14 @@ Script para convertir dataset de segmentación semántica a formato YOLO
 Soporta:
 - Detección con Bounding Boxes (YOLO Detection)
 - Segmentación de Instancias (YOLO Segmentation)
+
+La conversión reparte las imágenes entre WORKERS procesos (en bloques de
+CHUNKSIZE) y apunta cada imagen terminada en un manifiesto (MANIFEST_FILE en la
+carpeta de salida, una línea JSON por imagen). Si se interrumpe, al relanzar solo se procesan las
+imágenes que faltan; para rehacerlo todo basta con borrar el manifiesto.
+
+Uso: python crear_dataset_YOLO.py   (o, desde otro script,
+     convert_dataset(color_to_class, images_dir=..., masks_dir=..., output_path=...))
 """
 
 import cv2
@@ -10,8 +18,11 @@ import numpy as np
 import pandas as pd
 from pathlib import Path
 import os
+import shutil
 from PIL import Image
 import json
+from functools import partial
+from multiprocessing import Pool
 
 # ==========================================
 # CONFIGURACIÓN
@@ -35,155 +46,180 @@ MODO = 'detection'  # 'detection' o 'segmentation'
 MIN_AREA = 100  # Área mínima del objeto (píxeles) para ser considerado
 TRAIN_SPLIT = 0.8  # 80% train, 20% val
 
-print("="*60)
-print("🔄 CONVERSIÓN DE DATASET A FORMATO YOLO")
-print("="*60)
-print(f"\n📁 Dataset origen: {BASE_PATH}")
-print(f"📁 Dataset destino: {OUTPUT_PATH}")
-print(f"🎯 Modo: {MODO.upper()}")
-print(f"📊 Train/Val split: {TRAIN_SPLIT*100:.0f}% / {(1-TRAIN_SPLIT)*100:.0f}%")
+# Paralelismo y reanudación
+WORKERS = os.cpu_count()  # Procesos de conversión
+CHUNKSIZE = 4  # Imágenes por bloque enviado a cada proceso
+MANIFEST_FILE = 'manifest.jsonl'  # Imágenes ya convertidas, dentro de OUTPUT_PATH
+
+# Cómo se colocan las imágenes en images/{split}: 'hardlink', 'symlink' o 'copy'.
+# Las imágenes no se decodifican ni recodifican; si el enlace falla (otro disco,
+# sistema de ficheros sin soporte) se copian los bytes
+STAGING = 'hardlink'
+
+# Índice compacto por split (ruta, tamaño, clases y cajas de cada imagen), para
+# estadísticas, remapeo y visualización sin releer los .txt
+INDEX_FILE = 'index_{split}.npz'  # Dentro de OUTPUT_PATH
 
 # ==========================================
 # PASO 1: Leer Mapeo de Colores
 # ==========================================
 
-print("\n" + "="*60)
-print("📋 PASO 1: Leer mapeo de colores RGB")
-print("="*60)
-
-# Leer CSV
-df_colors = pd.read_csv(CSV_FILE)
-
-print(f"\n✅ CSV cargado: {len(df_colors)} clases encontradas")
-print("\n📝 Clases:")
-
-# Crear diccionario de mapeo RGB -> clase_id y nombre
-color_to_class = {}
-class_names = []
-
-for idx, row in df_colors.iterrows():
-    name = row['name']
-    r = int(row['r'])
-    g = int(row['g'])
-    b = int(row['b'])
+def load_class_map(csv_file=CSV_FILE):
+    """
+    Lee el CSV de colores. Retorna (color_to_class, class_names)
+    """
+    print("\n" + "="*60)
+    print("📋 PASO 1: Leer mapeo de colores RGB")
+    print("="*60)
     
-    # RGB como tupla
-    rgb_key = (r, g, b)
-    color_to_class[rgb_key] = idx
-    class_names.append(name)
+    # Leer CSV
+    df_colors = pd.read_csv(csv_file)
     
-    print(f"   {idx}: {name} - RGB({r}, {g}, {b})")
-
-num_classes = len(class_names)
-print(f"\n🎯 Total de clases: {num_classes}")
+    print(f"\n✅ CSV cargado: {len(df_colors)} clases encontradas")
+    print("\n📝 Clases:")
+    
+    # Crear diccionario de mapeo RGB -> clase_id y nombre
+    color_to_class = {}
+    class_names = []
+    
+    for idx, row in df_colors.iterrows():
+        name = row['name']
+        r = int(row['r'])
+        g = int(row['g'])
+        b = int(row['b'])
+        
+        # RGB como tupla
+        rgb_key = (r, g, b)
+        color_to_class[rgb_key] = idx
+        class_names.append(name)
+        
+        print(f"   {idx}: {name} - RGB({r}, {g}, {b})")
+    
+    print(f"\n🎯 Total de clases: {len(class_names)}")
+    return color_to_class, class_names
 
 # ==========================================
 # PASO 2: Crear Estructura de Carpetas YOLO
 # ==========================================
 
-print("\n" + "="*60)
-print("📁 PASO 2: Crear estructura de carpetas")
-print("="*60)
-
-# Crear carpetas
-folders = [
-    'images/train',
-    'images/val',
-    'labels/train',
-    'labels/val'
-]
-
-for folder in folders:
-    folder_path = os.path.join(OUTPUT_PATH, folder)
-    os.makedirs(folder_path, exist_ok=True)
-    print(f"   ✅ {folder}")
+def create_folders(output_path=OUTPUT_PATH):
+    print("\n" + "="*60)
+    print("📁 PASO 2: Crear estructura de carpetas")
+    print("="*60)
+    
+    # Crear carpetas
+    folders = [
+        'images/train',
+        'images/val',
+        'labels/train',
+        'labels/val'
+    ]
+    
+    for folder in folders:
+        folder_path = os.path.join(output_path, folder)
+        os.makedirs(folder_path, exist_ok=True)
+        print(f"   ✅ {folder}")
 
 # ==========================================
 # PASO 3: Funciones de Conversión
 # ==========================================
 
-def rgb_to_class_mask(rgb_mask, color_to_class):
+UNKNOWN_CLASS = 255  # Valor del LUT para colores que no están en el CSV
+
+def build_color_lut(color_to_class):
+    """
+    LUT de 2^24 entradas (16 MB): color RGB empaquetado (r<<16 | g<<8 | b) -> ID de clase
+    """
+    lut = np.full(1 << 24, UNKNOWN_CLASS, dtype=np.uint8)
+    for (r, g, b), class_id in color_to_class.items():
+        lut[(r << 16) | (g << 8) | b] = class_id
+    return lut
+
+def rgb_to_class_mask(rgb_mask, color_lut, name=''):
     """
     Convierte máscara RGB a máscara de clases (cada píxel = ID de clase)
+    en una sola pasada: empaqueta RGB en un entero de 24 bits y lo indexa en el LUT.
+    Los colores desconocidos se avisan y quedan como clase 0 (como antes).
     """
-    height, width = rgb_mask.shape[:2]
-    class_mask = np.zeros((height, width), dtype=np.uint8)
+    packed = rgb_mask[..., 0].astype(np.uint32) << 16
+    packed |= rgb_mask[..., 1].astype(np.uint32) << 8
+    packed |= rgb_mask[..., 2]
+    class_mask = color_lut[packed]
     
-    for rgb_color, class_id in color_to_class.items():
-        # Crear máscara para este color
-        mask = np.all(rgb_mask == rgb_color, axis=-1)
-        class_mask[mask] = class_id
+    unknown = class_mask == UNKNOWN_CLASS
+    if unknown.any():
+        colors = np.unique(packed[unknown])
+        shown = [((c >> 16) & 255, (c >> 8) & 255, c & 255) for c in colors[:5].tolist()]
+        print(f"   ⚠️ {name}: {int(unknown.sum())} píxeles con {len(colors)} colores fuera del CSV, "
+              f"p. ej. {shown}")
+        class_mask[unknown] = 0
     
     return class_mask
 
-def mask_to_bboxes(class_mask, class_id, min_area=100):
+def class_components(class_mask, min_area=100):
     """
-    Extrae bounding boxes de una máscara de clase específica
-    Retorna: lista de [class_id, x_center, y_center, width, height] normalizados
+    Componentes conexas de cada clase presente en la máscara.
+    Genera (class_id, labels, stats, keep): `keep` son los índices de las componentes
+    con área >= min_area y `stats` sus filas de connectedComponentsWithStats.
+    """
+    # Una pasada para saber qué clases aparecen: las ausentes (o con menos píxeles
+    # que min_area en total) no se etiquetan
+    counts = np.bincount(class_mask.ravel())
+    for class_id in np.flatnonzero(counts >= min_area):
+        binary_mask = (class_mask == class_id).view(np.uint8)
+        _, labels, stats, _ = cv2.connectedComponentsWithStats(binary_mask, connectivity=8)
+        
+        # Filtro de área vectorizado (la fila 0 es el fondo)
+        keep = np.flatnonzero(stats[1:, cv2.CC_STAT_AREA] >= min_area) + 1
+        if keep.size:
+            yield int(class_id), labels, stats[keep], keep
+
+def mask_to_bboxes(class_mask, min_area=100):
+    """
+    Extrae bounding boxes de todas las clases de la máscara
+    Retorna: array (N, 5) de [class_id, x_center, y_center, width, height] normalizados
     """
-    # Crear máscara binaria para esta clase
-    binary_mask = (class_mask == class_id).astype(np.uint8)
-    
-    # Encontrar contornos
-    contours, _ = cv2.findContours(binary_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-    
-    bboxes = []
     height, width = class_mask.shape
+    bboxes = []
     
-    for contour in contours:
-        # Filtrar contornos pequeños
-        area = cv2.contourArea(contour)
-        if area < min_area:
-            continue
-        
-        # Obtener bounding box
-        x, y, w, h = cv2.boundingRect(contour)
+    for class_id, _, stats, _ in class_components(class_mask, min_area):
+        x, y, w, h = stats[:, :4].T
         
         # Normalizar coordenadas (YOLO format)
-        x_center = (x + w / 2) / width
-        y_center = (y + h / 2) / height
-        w_norm = w / width
-        h_norm = h / height
-        
-        bboxes.append([class_id, x_center, y_center, w_norm, h_norm])
+        bboxes.append(np.column_stack([
+            np.full(len(x), class_id),
+            (x + w / 2) / width,
+            (y + h / 2) / height,
+            w / width,
+            h / height,
+        ]))
     
-    return bboxes
+    return np.concatenate(bboxes) if bboxes else np.empty((0, 5))
 
-def mask_to_polygons(class_mask, class_id, min_area=100):
+def mask_to_polygons(class_mask, min_area=100):
     """
-    Extrae polígonos de segmentación de una máscara de clase específica
+    Extrae polígonos de segmentación de todas las clases de la máscara
     Retorna: lista de [class_id, [x1, y1, x2, y2, ...]] normalizados
     """
-    # Crear máscara binaria para esta clase
-    binary_mask = (class_mask == class_id).astype(np.uint8)
-    
-    # Encontrar contornos
-    contours, _ = cv2.findContours(binary_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-    
     polygons = []
     height, width = class_mask.shape
     
-    for contour in contours:
-        # Filtrar contornos pequeños
-        area = cv2.contourArea(contour)
-        if area < min_area:
-            continue
-        
-        # Simplificar contorno
-        epsilon = 0.005 * cv2.arcLength(contour, True)
-        approx = cv2.approxPolyDP(contour, epsilon, True)
-        
-        # Convertir a lista de coordenadas normalizadas
-        polygon = []
-        for point in approx:
-            x, y = point[0]
-            x_norm = x / width
-            y_norm = y / height
-            polygon.extend([x_norm, y_norm])
-        
-        # YOLO segmentation necesita al menos 3 puntos
-        if len(polygon) >= 6:  # 3 puntos = 6 coordenadas
-            polygons.append([class_id, polygon])
+    for class_id, labels, stats, keep in class_components(class_mask, min_area):
+        # Contornos solo de las componentes que pasan el filtro, sobre su recorte
+        for (x, y, w, h), component in zip(stats[:, :4], keep):
+            component_mask = (labels[y:y + h, x:x + w] == component).view(np.uint8)
+            contours, _ = cv2.findContours(component_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE,
+                                           offset=(int(x), int(y)))
+            contour = max(contours, key=len)
+            
+            # Simplificar contorno
+            epsilon = 0.005 * cv2.arcLength(contour, True)
+            approx = cv2.approxPolyDP(contour, epsilon, True)
+            
+            # YOLO segmentation necesita al menos 3 puntos
+            if len(approx) >= 3:
+                polygon = (approx.reshape(-1, 2) / (width, height)).ravel().tolist()
+                polygons.append([class_id, polygon])
     
     return polygons
 
@@ -192,15 +228,13 @@ def save_yolo_labels(labels, output_file, mode='detection'):
     Guarda etiquetas en formato YOLO
     """
     with open(output_file, 'w') as f:
-        for label in labels:
-            if mode == 'detection':
-                # Formato: class_id x_center y_center width height
-                class_id, x_c, y_c, w, h = label
-                f.write(f"{class_id} {x_c:.6f} {y_c:.6f} {w:.6f} {h:.6f}\n")
-            
-            elif mode == 'segmentation':
+        if mode == 'detection':
+            # Formato: class_id x_center y_center width height (todo el array de una vez)
+            f.write(("%d %.6f %.6f %.6f %.6f\n" * len(labels)) % tuple(labels.ravel()))
+        
+        elif mode == 'segmentation':
+            for class_id, polygon in labels:
                 # Formato: class_id x1 y1 x2 y2 x3 y3 ...
-                class_id, polygon = label
                 polygon_str = ' '.join([f"{coord:.6f}" for coord in polygon])
                 f.write(f"{class_id} {polygon_str}\n")
 
@@ -208,179 +242,387 @@ def save_yolo_labels(labels, output_file, mode='detection'):
 # PASO 4: Procesar Imágenes
 # ==========================================
 
-print("\n" + "="*60)
-print("🔄 PASO 4: Procesando imágenes")
-print("="*60)
+# LUT de colores de cada proceso de conversión (lo crea init_worker)
+color_lut = None
 
-# Listar todas las imágenes originales
-original_files = sorted([f for f in os.listdir(ORIGINAL_IMAGES) 
-                        if f.endswith(('.jpg', '.jpeg', '.png'))])
-
-print(f"\n📊 Total de imágenes: {len(original_files)}")
+def init_worker(color_to_class):
+    """
+    Inicializa un proceso de conversión: construye el LUT una vez por proceso
+    """
+    global color_lut
+    color_lut = build_color_lut(color_to_class)
 
-# Determinar split train/val
-num_train = int(len(original_files) * TRAIN_SPLIT)
-train_files = original_files[:num_train]
-val_files = original_files[num_train:]
+def image_size(img_path):
+    """
+    (ancho, alto) de una imagen leyendo solo su cabecera, sin decodificar píxeles
+    """
+    with Image.open(img_path) as img:
+        return img.size
 
-print(f"   Train: {len(train_files)}")
-print(f"   Val: {len(val_files)}")
+def stage_image(src, dst, mode=STAGING):
+    """
+    Coloca `src` en `dst` según `mode` ('hardlink', 'symlink' o 'copy').
+    Si el enlace no es posible se copian los bytes.
+    """
+    if os.path.lexists(dst):
+        os.remove(dst)  # Reejecución: se sustituye lo que hubiera
+    
+    try:
+        if mode == 'hardlink':
+            os.link(src, dst)
+            return
+        if mode == 'symlink':
+            os.symlink(os.path.abspath(src), dst)
+            return
+    except OSError:
+        pass
+    
+    shutil.copyfile(src, dst)
 
-def process_image(img_name, split='train'):
+def process_image(img_name, split='train', images_dir=ORIGINAL_IMAGES, masks_dir=RGB_MASKS,
+                  output_path=OUTPUT_PATH, mode=MODO, min_area=MIN_AREA, staging=STAGING):
     """
     Procesa una imagen y genera sus etiquetas YOLO
+    Retorna su registro para el índice ({'size', 'classes', 'boxes'}) o None si no se usa
     """
     # Rutas
-    img_path = os.path.join(ORIGINAL_IMAGES, img_name)
+    img_path = os.path.join(images_dir, img_name)
     
     # Buscar máscara RGB correspondiente
     mask_name = img_name.replace('.jpg', '.png').replace('.jpeg', '.png')
-    rgb_mask_path = os.path.join(RGB_MASKS, mask_name)
+    rgb_mask_path = os.path.join(masks_dir, mask_name)
     
     if not os.path.exists(rgb_mask_path):
         print(f"   ⚠️ Máscara no encontrada para: {img_name}")
-        return False
+        return None
     
-    # Leer imagen y máscara
-    img = cv2.imread(img_path)
+    # Leer máscara (de la imagen solo hace falta el tamaño, de su cabecera)
     rgb_mask = cv2.imread(rgb_mask_path)
     rgb_mask = cv2.cvtColor(rgb_mask, cv2.COLOR_BGR2RGB)
     
-    # Convertir RGB mask a class mask
-    class_mask = rgb_to_class_mask(rgb_mask, color_to_class)
+    # Las etiquetas se normalizan con el tamaño de la máscara: debe coincidir con el de la imagen
+    width, height = image_size(img_path)
+    if rgb_mask.shape[:2] != (height, width):
+        print(f"   ⚠️ Máscara {rgb_mask.shape[1]}x{rgb_mask.shape[0]} distinta de la imagen "
+              f"{width}x{height}: {img_name}")
     
-    # Extraer etiquetas según el modo
-    all_labels = []
+    # Convertir RGB mask a class mask
+    class_mask = rgb_to_class_mask(rgb_mask, color_lut, name=mask_name)
     
-    for class_id in range(num_classes):
-        if MODO == 'detection':
-            labels = mask_to_bboxes(class_mask, class_id, min_area=MIN_AREA)
-        elif MODO == 'segmentation':
-            labels = mask_to_polygons(class_mask, class_id, min_area=MIN_AREA)
-        
-        all_labels.extend(labels)
+    # Extraer etiquetas según el modo (todas las clases a la vez)
+    if mode == 'detection':
+        all_labels = mask_to_bboxes(class_mask, min_area=min_area)
+    elif mode == 'segmentation':
+        all_labels = mask_to_polygons(class_mask, min_area=min_area)
+    else:
+        raise ValueError(f"Modo desconocido: {mode}")
     
     # Si no hay objetos, saltar
     if len(all_labels) == 0:
         print(f"   ⚠️ Sin objetos: {img_name}")
-        return False
+        return None
     
-    # Guardar imagen en carpeta correspondiente
-    output_img_path = os.path.join(OUTPUT_PATH, 'images', split, img_name)
-    cv2.imwrite(output_img_path, img)
+    # Colocar imagen en carpeta correspondiente (enlace o copia, sin recodificar)
+    output_img_path = os.path.join(output_path, 'images', split, img_name)
+    stage_image(img_path, output_img_path, mode=staging)
     
     # Guardar etiquetas
     label_name = img_name.replace('.jpg', '.txt').replace('.jpeg', '.txt').replace('.png', '.txt')
-    output_label_path = os.path.join(OUTPUT_PATH, 'labels', split, label_name)
-    save_yolo_labels(all_labels, output_label_path, mode=MODO)
+    output_label_path = os.path.join(output_path, 'labels', split, label_name)
+    save_yolo_labels(all_labels, output_label_path, mode=mode)
+    
+    classes, boxes = label_boxes(all_labels, mode=mode)
+    return {'size': [width, height], 'classes': classes.tolist(), 'boxes': boxes.round(6).tolist()}
+
+def process_task(task, **settings):
+    """
+    Envoltorio para el pool: (split, img_name) -> (split, img_name, modo usado, registro o None).
+    `settings` (rutas, modo, área mínima, staging) llegan explícitos: con spawn (Windows)
+    los procesos reimportan el módulo y no verían los globales cambiados por quien llama.
+    """
+    split, img_name = task
+    return split, img_name, settings['mode'], process_image(img_name, split=split, **settings)
+
+def load_manifest(output_path=OUTPUT_PATH, mode=MODO):
+    """
+    Lee el manifiesto de imágenes terminadas: {(split, img_name): entrada} del modo `mode`.
+    Las entradas con ok=True llevan también el registro del índice de la imagen.
+    """
+    manifest_file = os.path.join(output_path, MANIFEST_FILE)
+    done = {}
+    if not os.path.exists(manifest_file):
+        return done
+    with open(manifest_file, 'r') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # Última línea a medio escribir de una ejecución interrumpida
+            if entry.get('mode') == mode:
+                done[(entry['split'], entry['image'])] = entry
+    return done
+
+def split_files(images_dir=ORIGINAL_IMAGES):
+    """
+    Lista las imágenes originales y las reparte en train/val
+    """
+    original_files = sorted([f for f in os.listdir(images_dir) 
+                            if f.endswith(('.jpg', '.jpeg', '.png'))])
     
-    return True
+    # Determinar split train/val
+    num_train = int(len(original_files) * TRAIN_SPLIT)
+    return {'train': original_files[:num_train], 'val': original_files[num_train:]}
 
-# Procesar train
-print("\n🔄 Procesando imágenes de entrenamiento...")
-train_success = 0
-for i, img_name in enumerate(train_files):
-    if process_image(img_name, split='train'):
-        train_success += 1
+def convert_dataset(color_to_class, images_dir=None, masks_dir=None, output_path=None, mode=None,
+                    min_area=None, staging=None, workers=WORKERS, chunksize=CHUNKSIZE, mp_context=None):
+    """
+    Convierte todas las imágenes de `images_dir` (máscaras en `masks_dir`) a `output_path`
+    en paralelo, saltando las que ya figuran en el manifiesto de `output_path`.
+    Los parámetros a None toman el valor actual de la constante del módulo
+    (ORIGINAL_IMAGES, RGB_MASKS, OUTPUT_PATH, MODO, MIN_AREA, STAGING) y se pasan
+    explícitos a los procesos. `mp_context` permite elegir el método de arranque.
+    Retorna {split: imágenes con etiquetas} (incluidas las de ejecuciones previas)
+    """
+    settings = {
+        'images_dir': ORIGINAL_IMAGES if images_dir is None else images_dir,
+        'masks_dir': RGB_MASKS if masks_dir is None else masks_dir,
+        'output_path': OUTPUT_PATH if output_path is None else output_path,
+        'mode': MODO if mode is None else mode,
+        'min_area': MIN_AREA if min_area is None else min_area,
+        'staging': STAGING if staging is None else staging,
+    }
+    output_path, mode = settings['output_path'], settings['mode']
+
+    print("\n" + "="*60)
+    print("🔄 PASO 4: Procesando imágenes")
+    print("="*60)
+    
+    splits = split_files(settings['images_dir'])
+    total = sum(len(files) for files in splits.values())
+    print(f"\n📊 Total de imágenes: {total}")
+    for split, files in splits.items():
+        print(f"   {split.capitalize()}: {len(files)}")
     
-    if (i + 1) % 50 == 0:
-        print(f"   Procesadas: {i+1}/{len(train_files)}")
+    done = load_manifest(output_path, mode)
+    tasks = [(split, img_name) for split, files in splits.items() for img_name in files
+             if (split, img_name) not in done]
+    if done:
+        print(f"\n♻️ Manifiesto: {total - len(tasks)} imágenes ya convertidas, faltan {len(tasks)}")
+    
+    success = {split: sum(1 for img_name in files if (split, img_name) in done and done[(split, img_name)]['ok'])
+               for split, files in splits.items()}
+    
+    print(f"\n🔄 Procesando {len(tasks)} imágenes con {workers} procesos...")
+    task = partial(process_task, **settings)
+    pool_class = Pool if mp_context is None else mp_context.Pool
+    with pool_class(workers, initializer=init_worker, initargs=(color_to_class,)) as pool, \
+            open(os.path.join(output_path, MANIFEST_FILE), 'a') as manifest:
+        for i, (split, img_name, used_mode, record) in enumerate(pool.imap_unordered(task, tasks, chunksize=chunksize)):
+            ok = record is not None
+            success[split] += ok
+            # Se apunta en cuanto termina (con el modo que usó el proceso): una interrupción
+            # solo pierde las imágenes en curso
+            entry = {'split': split, 'image': img_name, 'ok': ok, 'mode': used_mode, **(record or {})}
+            done[(split, img_name)] = entry
+            manifest.write(json.dumps(entry) + "\n")
+            manifest.flush()
+            
+            if (i + 1) % 50 == 0:
+                print(f"   Procesadas: {i+1}/{len(tasks)}")
+    
+    for split, files in splits.items():
+        print(f"   ✅ {split.capitalize()}: {success[split]}/{len(files)} exitosas")
+    
+    # El manifiesto es el registro incremental; el índice se recompacta a partir de él
+    for split, files in splits.items():
+        entries = [done[(split, img_name)] for img_name in files
+                   if (split, img_name) in done and done[(split, img_name)]['ok']]
+        index_path = save_index(build_index(entries, split), split, output_path)
+        print(f"   📇 Índice {split}: {index_path}")
+    return success
 
-print(f"   ✅ Train: {train_success}/{len(train_files)} exitosas")
+# ==========================================
+# Índice del dataset
+# ==========================================
 
-# Procesar val
-print("\n🔄 Procesando imágenes de validación...")
-val_success = 0
-for i, img_name in enumerate(val_files):
-    if process_image(img_name, split='val'):
-        val_success += 1
+def label_boxes(labels, mode='detection'):
+    """
+    Clases (N,) y cajas (N, 4) [x_center, y_center, width, height] normalizadas
+    de las etiquetas de una imagen; en segmentación, la caja envolvente de cada polígono
+    """
+    if mode == 'detection':
+        return labels[:, 0].astype(np.int16), labels[:, 1:].astype(np.float32)
+    
+    classes = np.array([class_id for class_id, _ in labels], dtype=np.int16)
+    boxes = np.empty((len(labels), 4), dtype=np.float32)
+    for i, (_, polygon) in enumerate(labels):
+        points = np.asarray(polygon).reshape(-1, 2)
+        lo, hi = points.min(axis=0), points.max(axis=0)
+        boxes[i] = [*(lo + hi) / 2, *(hi - lo)]
+    return classes, boxes
+
+def build_index(entries, split):
+    """
+    Índice de un split a partir de las entradas del manifiesto: las etiquetas de la
+    imagen i son classes[offsets[i]:offsets[i+1]] y boxes[offsets[i]:offsets[i+1]]
+    """
+    counts = [len(entry['classes']) for entry in entries]
+    boxes = [box for entry in entries for box in entry['boxes']]
+    return {
+        'images': np.array([os.path.join('images', split, entry['image']) for entry in entries], dtype=str),
+        'sizes': np.array([entry['size'] for entry in entries], dtype=np.int32).reshape(-1, 2),
+        'offsets': np.concatenate([[0], np.cumsum(counts)]).astype(np.int64),
+        'classes': np.array([c for entry in entries for c in entry['classes']], dtype=np.int16),
+        'boxes': np.array(boxes, dtype=np.float32).reshape(-1, 4),
+    }
+
+def save_index(index, split, output_path=OUTPUT_PATH):
+    index_path = os.path.join(output_path, INDEX_FILE.format(split=split))
+    tmp_path = index_path[:-len('.npz')] + '.tmp.npz'
+    np.savez(tmp_path, **index)
+    os.replace(tmp_path, index_path)  # Sin índices a medio escribir si se interrumpe
+    return index_path
+
+def load_index(split, output_path=OUTPUT_PATH):
+    """
+    Carga el índice de un split: dict con images, sizes, offsets, classes y boxes
+    """
+    index_path = os.path.join(output_path, INDEX_FILE.format(split=split))
+    with np.load(index_path) as data:
+        return {key: data[key] for key in data.files}
+
+def class_histogram(index, num_classes):
+    """
+    Número de objetos por clase del índice
+    """
+    return np.bincount(index['classes'], minlength=num_classes)
+
+def images_with_classes(index, class_ids):
+    """
+    Posiciones en el índice de las imágenes con algún objeto de `class_ids`
+    """
+    # Imagen de cada objeto, a partir de los offsets
+    owners = np.repeat(np.arange(len(index['images'])), np.diff(index['offsets']))
+    return np.unique(owners[np.isin(index['classes'], list(class_ids))])
+
+def remap_classes(mapping, split, output_path=OUTPUT_PATH, mode=MODO):
+    """
+    Cambia los IDs de clase según `mapping` ({id_viejo: id_nuevo}) en el índice y en el
+    manifiesto (del que se reconstruye el índice en cada conversión), y reescribe solo
+    los .txt de las imágenes afectadas (las que dice el índice)
+    """
+    if not mapping:
+        return 0
     
-    if (i + 1) % 50 == 0:
-        print(f"   Procesadas: {i+1}/{len(val_files)}")
+    index = load_index(split, output_path)
+    lut = np.arange(max(int(index['classes'].max(initial=0)), *mapping) + 1, dtype=np.int16)
+    lut[list(mapping)] = list(mapping.values())
+    
+    affected = images_with_classes(index, mapping)
+    for i in affected:
+        label_path = os.path.join(output_path, str(index['images'][i]).replace('images', 'labels', 1))
+        label_path = os.path.splitext(label_path)[0] + '.txt'
+        with open(label_path, 'r') as f:
+            lines = f.read().splitlines()
+        new_classes = lut[index['classes'][index['offsets'][i]:index['offsets'][i + 1]]]
+        with open(label_path, 'w') as f:
+            for class_id, line in zip(new_classes, lines):
+                f.write(f"{class_id} {line.split(' ', 1)[1]}\n")
+    
+    remap_manifest(lut, split, output_path, mode)
+    index['classes'] = lut[index['classes']]
+    save_index(index, split, output_path)
+    return len(affected)
 
-print(f"   ✅ Val: {val_success}/{len(val_files)} exitosas")
+def remap_manifest(lut, split, output_path=OUTPUT_PATH, mode=MODO):
+    """
+    Aplica el LUT de clases a las entradas del manifiesto de `split` y modo `mode`,
+    para que la siguiente conversión no reconstruya el índice con los IDs antiguos
+    """
+    manifest_file = os.path.join(output_path, MANIFEST_FILE)
+    if not os.path.exists(manifest_file):
+        return
+    
+    tmp_file = manifest_file + '.tmp'
+    with open(manifest_file, 'r') as f, open(tmp_file, 'w') as out:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # Línea a medio escribir de una ejecución interrumpida
+            if entry.get('mode') == mode and entry['split'] == split and entry.get('classes'):
+                classes = np.asarray(entry['classes'])
+                # IDs fuera del LUT no pueden estar en el mapeo: se dejan igual
+                inside = classes < len(lut)
+                classes[inside] = lut[classes[inside]]
+                entry['classes'] = classes.tolist()
+            out.write(json.dumps(entry) + "\n")
+    os.replace(tmp_file, manifest_file)
 
 # ==========================================
 # PASO 5: Crear archivo YAML
 # ==========================================
 
-print("\n" + "="*60)
-print("📄 PASO 5: Crear archivo YAML de configuración")
-print("="*60)
-
-yaml_content = f"""# Dataset Configuration for YOLO
-path: {OUTPUT_PATH}
+def write_yaml(class_names, output_path=OUTPUT_PATH):
+    print("\n" + "="*60)
+    print("📄 PASO 5: Crear archivo YAML de configuración")
+    print("="*60)
+    
+    yaml_content = f"""# Dataset Configuration for YOLO
+path: {output_path}
 train: images/train
 val: images/val
 
 # Classes
-nc: {num_classes}
+nc: {len(class_names)}
 names: {class_names}
 """
-
-yaml_path = os.path.join(OUTPUT_PATH, 'dataset.yaml')
-with open(yaml_path, 'w') as f:
-    f.write(yaml_content)
-
-print(f"\n✅ YAML creado: {yaml_path}")
-print("\n📋 Contenido:")
-print(yaml_content)
+    
+    yaml_path = os.path.join(output_path, 'dataset.yaml')
+    with open(yaml_path, 'w') as f:
+        f.write(yaml_content)
+    
+    print(f"\n✅ YAML creado: {yaml_path}")
+    print("\n📋 Contenido:")
+    print(yaml_content)
+    return yaml_path
 
 # ==========================================
 # PASO 6: Estadísticas del Dataset
 # ==========================================
 
-print("\n" + "="*60)
-print("📊 PASO 6: Estadísticas del dataset")
-print("="*60)
-
-def count_objects_per_class(labels_dir):
+def print_statistics(class_names, output_path=OUTPUT_PATH):
     """
-    Cuenta objetos por clase en un directorio de etiquetas
+    Imprime la distribución de objetos por clase. Retorna (total_train, total_val)
     """
-    class_counts = {i: 0 for i in range(num_classes)}
+    print("\n" + "="*60)
+    print("📊 PASO 6: Estadísticas del dataset")
+    print("="*60)
     
-    label_files = [f for f in os.listdir(labels_dir) if f.endswith('.txt')]
+    # Histogramas a partir del índice, sin releer los .txt
+    train_counts = class_histogram(load_index('train', output_path), len(class_names))
+    val_counts = class_histogram(load_index('val', output_path), len(class_names))
     
-    for label_file in label_files:
-        with open(os.path.join(labels_dir, label_file), 'r') as f:
-            for line in f:
-                parts = line.strip().split()
-                if parts:
-                    class_id = int(parts[0])
-                    class_counts[class_id] += 1
+    print("\n📊 Distribución de objetos por clase:")
+    print(f"\n{'Clase':<20} {'Train':<10} {'Val':<10} {'Total':<10}")
+    print("-" * 50)
     
-    return class_counts
-
-train_labels_dir = os.path.join(OUTPUT_PATH, 'labels/train')
-val_labels_dir = os.path.join(OUTPUT_PATH, 'labels/val')
-
-train_counts = count_objects_per_class(train_labels_dir)
-val_counts = count_objects_per_class(val_labels_dir)
-
-print("\n📊 Distribución de objetos por clase:")
-print(f"\n{'Clase':<20} {'Train':<10} {'Val':<10} {'Total':<10}")
-print("-" * 50)
-
-for i, class_name in enumerate(class_names):
-    train_count = train_counts[i]
-    val_count = val_counts[i]
-    total = train_count + val_count
-    print(f"{class_name:<20} {train_count:<10} {val_count:<10} {total:<10}")
-
-print("-" * 50)
-total_train = sum(train_counts.values())
-total_val = sum(val_counts.values())
-print(f"{'TOTAL':<20} {total_train:<10} {total_val:<10} {total_train + total_val:<10}")
+    for i, class_name in enumerate(class_names):
+        train_count = train_counts[i]
+        val_count = val_counts[i]
+        total = train_count + val_count
+        print(f"{class_name:<20} {train_count:<10} {val_count:<10} {total:<10}")
+    
+    print("-" * 50)
+    total_train = int(train_counts.sum())
+    total_val = int(val_counts.sum())
+    print(f"{'TOTAL':<20} {total_train:<10} {total_val:<10} {total_train + total_val:<10}")
+    return total_train, total_val
 
 # ==========================================
 # PASO 7: Visualizar Ejemplos
 # ==========================================
 
-print("\n" + "="*60)
-print("🖼️ PASO 7: Generar visualizaciones de ejemplo")
-print("="*60)
-
 def visualize_yolo_labels(img_path, label_path, class_names, mode='detection'):
     """
     Visualiza una imagen con sus etiquetas YOLO
@@ -447,37 +689,61 @@ def visualize_yolo_labels(img_path, label_path, class_names, mode='detection'):
     
     return img
 
-# Visualizar 3 ejemplos de train
-train_imgs = sorted(os.listdir(os.path.join(OUTPUT_PATH, 'images/train')))[:3]
-
-print("\n📸 Generando visualizaciones...")
-
-for img_name in train_imgs:
-    img_path = os.path.join(OUTPUT_PATH, 'images/train', img_name)
-    label_name = img_name.replace('.jpg', '.txt').replace('.png', '.txt')
-    label_path = os.path.join(OUTPUT_PATH, 'labels/train', label_name)
+def visualize_examples(class_names, output_path=OUTPUT_PATH, num_examples=3, mode=MODO):
+    print("\n" + "="*60)
+    print("🖼️ PASO 7: Generar visualizaciones de ejemplo")
+    print("="*60)
+    
+    # Visualizar ejemplos de train (del índice: todas tienen etiquetas)
+    train_imgs = load_index('train', output_path)['images'][:num_examples]
     
-    if os.path.exists(label_path):
-        vis_img = visualize_yolo_labels(img_path, label_path, class_names, mode=MODO)
+    print("\n📸 Generando visualizaciones...")
+    
+    for rel_path in train_imgs:
+        img_path = os.path.join(output_path, rel_path)
+        img_name = os.path.basename(rel_path)
+        label_path = os.path.join(output_path, 'labels/train', os.path.splitext(img_name)[0] + '.txt')
+        
+        vis_img = visualize_yolo_labels(img_path, label_path, class_names, mode=mode)
         
         # Guardar visualización
-        vis_path = os.path.join(OUTPUT_PATH, f'vis_{img_name}')
+        vis_path = os.path.join(output_path, f'vis_{img_name}')
         cv2.imwrite(vis_path, vis_img)
         print(f"   ✅ {vis_path}")
 
 # ==========================================
-# RESUMEN FINAL
+# PROGRAMA PRINCIPAL
 # ==========================================
 
-print("\n" + "="*60)
-print("✅ CONVERSIÓN COMPLETADA")
-print("="*60)
-
-print(f"""
+def main():
+    print("="*60)
+    print("🔄 CONVERSIÓN DE DATASET A FORMATO YOLO")
+    print("="*60)
+    print(f"\n📁 Dataset origen: {BASE_PATH}")
+    print(f"📁 Dataset destino: {OUTPUT_PATH}")
+    print(f"🎯 Modo: {MODO.upper()}")
+    print(f"📊 Train/Val split: {TRAIN_SPLIT*100:.0f}% / {(1-TRAIN_SPLIT)*100:.0f}%")
+    
+    color_to_class, class_names = load_class_map()
+    create_folders()
+    success = convert_dataset(color_to_class)
+    yaml_path = write_yaml(class_names)
+    total_train, total_val = print_statistics(class_names)
+    visualize_examples(class_names)
+    
+    # ==========================================
+    # RESUMEN FINAL
+    # ==========================================
+    
+    print("\n" + "="*60)
+    print("✅ CONVERSIÓN COMPLETADA")
+    print("="*60)
+    
+    print(f"""
 📊 Resumen:
-   • Imágenes train: {train_success}
-   • Imágenes val: {val_success}
-   • Clases: {num_classes}
+   • Imágenes train: {success['train']}
+   • Imágenes val: {success['val']}
+   • Clases: {len(class_names)}
    • Modo: {MODO.upper()}
    • Objetos train: {total_train}
    • Objetos val: {total_val}
@@ -491,4 +757,8 @@ print(f"""
 🚀 Próximo paso: Entrenar modelo
    Usa este YAML en tu entrenamiento:
    data='{yaml_path}'
-""")
\ No newline at end of file
+""")
+
+
+if __name__ == '__main__':
+    main()
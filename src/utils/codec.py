@@ -0,0 +1,137 @@
+"""
+Codificación de frames para frame_protocol.py
+
+JPEG usa libjpeg-turbo (PyTurboJPEG) si está instalado y, si no, OpenCV:
+    - Submuestreo de croma 4:2:0 (YUV) y, en perfiles "fast", DCT/upsampling rápidos.
+    - "jpeg_gray": solo luminancia (1/3 de datos); se decodifica de vuelta a BGR.
+    - Decodificación reducida en el dominio DCT (1/2, 1/4, 1/8) cuando el
+      consumidor necesita menos resolución (min_size).
+
+Para loopback, "raw" (bytes crudos, sin coste de CPU) y "lz4" (compresión
+rápida sin pérdidas, requiere el paquete lz4).
+
+PROFILES agrupa combinaciones típicas de encoding/calidad, de más calidad a menos
+latencia; send_frame(..., **PROFILES["fast"]).
+"""
+
+import cv2
+import numpy as np
+
+try:
+    from turbojpeg import (TurboJPEG, TJPF_BGR, TJPF_GRAY, TJSAMP_420, TJSAMP_GRAY,
+                           TJFLAG_FASTDCT, TJFLAG_FASTUPSAMPLE)
+    _turbo = TurboJPEG()
+except Exception:  # Paquete no instalado o libturbojpeg no encontrada
+    _turbo = None
+
+try:
+    import lz4.block as _lz4
+except ImportError:
+    _lz4 = None
+
+ENCODING_RAW = "raw"
+ENCODING_JPEG = "jpeg"
+ENCODING_JPEG_GRAY = "jpeg_gray"
+ENCODING_LZ4 = "lz4"
+
+PROFILES = {
+    "quality":  {"encoding": ENCODING_JPEG, "quality": 90},
+    "balanced": {"encoding": ENCODING_JPEG, "quality": 80},
+    "fast":     {"encoding": ENCODING_JPEG, "quality": 65, "fast": True},
+    "gray":     {"encoding": ENCODING_JPEG_GRAY, "quality": 75, "fast": True},
+    "lz4":      {"encoding": ENCODING_LZ4},   # Loopback: sin pérdidas, comprime zonas planas
+    "raw":      {"encoding": ENCODING_RAW},   # Loopback: sin coste de codificación
+}
+
+# Salidas de decodificación reutilizadas (libjpeg-turbo): (clave, forma) -> array
+_decode_buffers = {}
+
+# Decodificación reducida con OpenCV: factor -> flag
+_CV_REDUCED = {8: cv2.IMREAD_REDUCED_COLOR_8, 4: cv2.IMREAD_REDUCED_COLOR_4, 2: cv2.IMREAD_REDUCED_COLOR_2}
+
+
+def has_turbojpeg():
+    return _turbo is not None
+
+
+def encode(frame, encoding=ENCODING_JPEG, quality=80, fast=False):
+    """Codifica un frame BGR uint8. Devuelve un objeto con protocolo buffer (bytes o ndarray)."""
+    if encoding == ENCODING_RAW:
+        return np.ascontiguousarray(frame)
+    if encoding == ENCODING_LZ4:
+        if _lz4 is None:
+            raise ImportError("El encoding 'lz4' requiere el paquete lz4 (pip install lz4)")
+        return _lz4.compress(np.ascontiguousarray(frame), mode="fast", store_size=False)
+    if encoding == ENCODING_JPEG_GRAY:
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        if _turbo is not None:
+            return _turbo.encode(gray, quality=quality, pixel_format=TJPF_GRAY, jpeg_subsample=TJSAMP_GRAY)
+        return _cv_encode(gray, quality)
+    if encoding == ENCODING_JPEG:
+        if _turbo is not None:
+            flags = TJFLAG_FASTDCT if fast else 0
+            return _turbo.encode(frame, quality=quality, pixel_format=TJPF_BGR, jpeg_subsample=TJSAMP_420,
+                                 flags=flags)
+        return _cv_encode(frame, quality)
+    raise ValueError(f"Encoding desconocido: {encoding}")
+
+
+def _cv_encode(image, quality):
+    ok, payload = cv2.imencode('.jpg', image, [int(cv2.IMWRITE_JPEG_QUALITY), quality])
+    if not ok:
+        raise ValueError("cv2.imencode no pudo codificar el frame")
+    return payload
+
+
+def reduction_factor(shape, min_size):
+    """Mayor reducción (1, 2, 4 u 8) que deja el lado largo en al menos `min_size` píxeles."""
+    if min_size:
+        for factor in (8, 4, 2):
+            if max(shape[:2]) // factor >= min_size:
+                return factor
+    return 1
+
+
+def _output_buffer(key, shape):
+    out = _decode_buffers.get((key, shape))
+    if out is None:
+        out = _decode_buffers[(key, shape)] = np.empty(shape, dtype=np.uint8)
+    return out
+
+
+def decode(buf, encoding, shape, dtype="uint8", min_size=None, fast=False, out_key=None):
+    """
+    Decodifica `buf` (bytes o memoryview) a un frame BGR. Con `min_size` los JPEG
+    grandes se decodifican ya reducidos, así que el frame puede ser menor que `shape`.
+
+    Con `out_key` (p. ej. el emisor) y libjpeg-turbo, el JPEG se decodifica sobre un
+    buffer reservado para esa clave y tamaño: el frame devuelto se sobrescribe en la
+    siguiente decodificación con la misma clave. OpenCV no admite destino (imdecode).
+    """
+    if encoding == ENCODING_RAW:
+        # Vista de solo lectura sobre el buffer recibido: sin copia
+        return np.frombuffer(buf, dtype=dtype).reshape(shape)
+    if encoding == ENCODING_LZ4:
+        if _lz4 is None:
+            raise ImportError("El encoding 'lz4' requiere el paquete lz4 (pip install lz4)")
+        size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        return np.frombuffer(_lz4.decompress(buf, uncompressed_size=size), dtype=dtype).reshape(shape)
+    if encoding in (ENCODING_JPEG, ENCODING_JPEG_GRAY):
+        factor = reduction_factor(shape, min_size)
+        if _turbo is not None:
+            gray = encoding == ENCODING_JPEG_GRAY
+            flags = TJFLAG_FASTDCT | TJFLAG_FASTUPSAMPLE if fast else 0
+            # Tamaño tras el escalado DCT (redondeo hacia arriba, como libjpeg-turbo)
+            size = (-(-shape[0] // factor), -(-shape[1] // factor))
+            dst = None if out_key is None else _output_buffer((out_key, gray), size + (1 if gray else 3,))
+            # El buffer (memoryview / zmq) se pasa tal cual: sin copiarlo a bytes
+            image = _turbo.decode(buf, pixel_format=TJPF_GRAY if gray else TJPF_BGR,
+                                  scaling_factor=(1, factor) if factor > 1 else None, flags=flags, dst=dst)
+            if not gray:
+                return image
+            bgr = None if out_key is None else _output_buffer(out_key, size + (3,))
+            return cv2.cvtColor(image, cv2.COLOR_GRAY2BGR, dst=bgr)
+        data = np.frombuffer(buf, dtype=np.uint8)
+        # IMREAD_REDUCED_COLOR_* convierte también los JPEG en gris a BGR
+        return cv2.imdecode(data, _CV_REDUCED.get(factor, cv2.IMREAD_COLOR))
+    raise ValueError(f"Encoding desconocido: {encoding}")
@@ -0,0 +1,286 @@
+"""
+Protocolo binario de transporte de frames entre dron_autonomo.py y yolo_detector.py
+
+Cada mensaje ZMQ es multipart:
+    [0] cabecera -> JSON compacto con shape, dtype, frame_id, timestamp y encoding
+    [1] payload  -> frame codificado (codec.py: raw, lz4, JPEG...), enviado con copy=False
+
+Así evitamos base64 + JSON sobre la imagen completa (+33% de tamaño y varios ms
+por frame). La cabecera ocupa apenas un centenar de bytes.
+
+Con encoding "shm" el payload va vacío: el frame está en un SharedFrameRing
+(shm_ring.py) y la cabecera solo indica el bloque (nombre y nonce), el slot y la secuencia.
+
+Cada emisor se identifica con "source" en la cabecera. Las detecciones vuelven
+con topic = detection_topic(source), de modo que cada dron se suscribe solo a las
+suyas aunque el detector atienda a varios. Van como struct-of-arrays:
+    [topic, cabecera JSON (frame_id, source, timestamp, count), xyxy, conf, cls]
+con xyxy (N, 4) float32, conf (N,) float32 y cls (N,) int32 en bytes crudos.
+
+Por un canal aparte (PUSH -> PULL) cada dron registra en el detector qué quiere
+recibir: clases, confianza mínima y top-k (send_subscription). Así el filtrado
+se hace antes de NMS y de la red, no al llegar al dron.
+"""
+
+import json
+import time
+from collections import namedtuple
+
+import numpy as np
+import zmq
+
+import codec
+from codec import ENCODING_RAW, ENCODING_JPEG, ENCODING_JPEG_GRAY, ENCODING_LZ4, PROFILES
+from shm_ring import attach_cached, cached_ring
+
+ENCODING_SHM = "shm"
+
+DEFAULT_SOURCE = "dron0"
+
+
+# Detecciones de un frame como arrays por columna (vistas sobre el mensaje ZMQ)
+Detections = namedtuple("Detections", ["xyxy", "conf", "cls"])
+
+
+def encode_header(header):
+    return json.dumps(header, separators=(",", ":")).encode("utf-8")
+
+
+def decode_header(data):
+    return json.loads(bytes(data))
+
+
+def send_frame(socket, frame, frame_id, encoding=ENCODING_JPEG, quality=80, fast=False, flags=0, **extra):
+    """
+    Envía un frame como [cabecera, payload] sin copiar el payload.
+    `encoding`/`quality`/`fast` se pasan a codec.encode (o se toman de un perfil:
+    send_frame(..., **PROFILES["fast"])). Los campos extra (p. ej. altitud) se
+    añaden a la cabecera.
+    """
+    payload = codec.encode(frame, encoding, quality, fast)
+
+    header = {
+        "frame_id": int(frame_id),
+        "timestamp": time.time(),
+        "shape": list(frame.shape),
+        "dtype": str(frame.dtype),
+        "encoding": encoding,
+    }
+    if fast:
+        header["fast"] = True  # El decodificador también usa los modos rápidos
+    header.update(extra)
+    socket.send_multipart([encode_header(header), payload], flags=flags, copy=False)
+    return True
+
+
+def send_shm_frame(socket, ring, frame, frame_id, flags=0, **extra):
+    """
+    Copia el frame al anillo de memoria compartida y publica solo la cabecera.
+    """
+    written = ring.write(frame)
+    if written is None:
+        return False
+    slot, seq = written
+
+    header = {
+        "frame_id": int(frame_id),
+        "timestamp": time.time(),
+        "shape": list(frame.shape),
+        "dtype": str(frame.dtype),
+        "encoding": ENCODING_SHM,
+        "shm_name": ring.name,
+        "shm_nonce": ring.nonce,
+        "slot": slot,
+        "seq": seq,
+    }
+    header.update(extra)
+    socket.send_multipart([encode_header(header), b""], flags=flags, copy=False)
+    return True
+
+
+def decode_frame(header, payload, min_size=None, out_key=None):
+    """
+    Reconstruye el frame a partir de la cabecera y un buffer (bytes, memoryview o zmq.Frame).
+
+    Con `min_size` (p. ej. el tamaño de entrada del modelo) un JPEG mucho mayor se
+    decodifica ya reducido a 1/2, 1/4 u 1/8: menos trabajo y un buffer más pequeño.
+    El frame devuelto puede ser entonces menor que header["shape"].
+    Con `out_key` el JPEG se decodifica sobre un buffer reutilizado (ver codec.decode).
+    """
+    if header["encoding"] == ENCODING_SHM:
+        # Vista sobre la memoria compartida; None si el slot ya fue sobrescrito o si la
+        # cabecera es de un bloque que el productor ya recreó (reinicio)
+        ring = attach_cached(header["shm_name"], header["shm_nonce"])
+        if ring.nonce != header["shm_nonce"]:
+            return None
+        return ring.read(header["slot"], header["seq"], header["shape"], header["dtype"])
+
+    buf = payload.buffer if isinstance(payload, zmq.Frame) else payload
+    return codec.decode(buf, header["encoding"], header["shape"], header["dtype"], min_size,
+                        header.get("fast", False), out_key)
+
+
+def recv_frame(socket, flags=0):
+    """Recibe un mensaje multipart y devuelve (cabecera, frame)."""
+    parts = socket.recv_multipart(flags=flags, copy=False)
+    header = decode_header(parts[0].buffer)
+    return header, decode_frame(header, parts[1])
+
+
+def recv_latest_frame(socket):
+    """
+    Bloquea hasta recibir un frame y descarta los que estén en cola, decodificando
+    solo el más reciente. Sustituye a zmq.CONFLATE, que no admite mensajes multipart.
+    """
+    parts = socket.recv_multipart(copy=False)
+    try:
+        while True:
+            parts = socket.recv_multipart(flags=zmq.NOBLOCK, copy=False)
+    except zmq.Again:
+        pass
+
+    header = decode_header(parts[0].buffer)
+    return header, decode_frame(header, parts[1])
+
+
+def recv_latest_per_source(socket, max_frames=1, timeout_ms=0, min_size=None):
+    """
+    Recoge frames para un lote: bloquea hasta el primero y sigue recibiendo hasta
+    tener `max_frames` emisores distintos o agotar `timeout_ms`. De cada emisor se
+    queda solo el frame más reciente y solo esos se decodifican.
+
+    Devuelve una lista de (cabecera, frame), como mucho `max_frames`. `min_size`
+    se pasa a decode_frame. Cada cabecera incluye "skipped": cuántos frames de su
+    emisor se descartaron por llegar otro más nuevo (el detector no da abasto).
+    Los frames JPEG se decodifican sobre un buffer por emisor: son válidos hasta la
+    siguiente llamada (igual que las vistas de memoria compartida hasta release_frame).
+    """
+    latest = {}
+    skipped = {}
+
+    def add(parts):
+        header = decode_header(parts[0].buffer)
+        source = header.get("source", DEFAULT_SOURCE)
+        if source in latest:
+            skipped[source] = skipped.get(source, 0) + 1
+        latest[source] = (header, parts[1])
+
+    add(socket.recv_multipart(copy=False))
+    deadline = time.perf_counter() + timeout_ms / 1000
+    while len(latest) < max_frames:
+        remaining_ms = (deadline - time.perf_counter()) * 1000
+        if remaining_ms <= 0 or not socket.poll(remaining_ms):
+            break
+        add(socket.recv_multipart(copy=False))
+
+    # Vaciar la cola sin esperar: los frames atrasados se sustituyen por los nuevos
+    try:
+        while True:
+            add(socket.recv_multipart(flags=zmq.NOBLOCK, copy=False))
+    except zmq.Again:
+        pass
+
+    # Si hay más emisores que hueco en el lote, se atienden los más recientes
+    batch = sorted(latest.values(), key=lambda item: item[0]["timestamp"], reverse=True)[:max_frames]
+    for header, _ in batch:
+        header["skipped"] = skipped.get(header.get("source", DEFAULT_SOURCE), 0)
+    return [(header, decode_frame(header, payload, min_size, header.get("source", DEFAULT_SOURCE)))
+            for header, payload in batch]
+
+
+def detection_topic(source):
+    # Con "/" final para que "dron1" no reciba también lo de "dron10"
+    return f"det/{source}/".encode("utf-8")
+
+
+def send_detections(socket, source, header, xyxy, conf, cls, flags=0):
+    """
+    Publica las detecciones de un frame. `header` lleva los metadatos (frame_id,
+    timestamp...); se completa con source y el número de cajas.
+    """
+    xyxy = np.ascontiguousarray(xyxy, dtype=np.float32).reshape(-1, 4)
+    header = dict(header, source=source, count=len(xyxy))
+    socket.send_multipart([
+        detection_topic(source),
+        encode_header(header),
+        xyxy,
+        np.ascontiguousarray(conf, dtype=np.float32),
+        np.ascontiguousarray(cls, dtype=np.int32),
+    ], flags=flags)
+
+
+def recv_detections(socket, flags=0):
+    """Recibe un mensaje de detecciones y devuelve (cabecera, Detections)."""
+    _, header, xyxy, conf, cls = socket.recv_multipart(flags=flags)
+    header = decode_header(header)
+    return header, Detections(
+        np.frombuffer(xyxy, dtype=np.float32).reshape(-1, 4),
+        np.frombuffer(conf, dtype=np.float32),
+        np.frombuffer(cls, dtype=np.int32),
+    )
+
+
+def send_subscription(socket, source, classes=None, min_conf=None, top_k=None):
+    """
+    Registra (o actualiza) lo que `source` quiere recibir del detector.
+    None en un campo = sin filtro. No bloquea: si no hay detector, se descarta
+    y el dron lo vuelve a enviar más tarde.
+    """
+    spec = {
+        "source": source,
+        "classes": None if classes is None else [int(c) for c in classes],
+        "min_conf": None if min_conf is None else float(min_conf),
+        "top_k": None if top_k is None else int(top_k),
+    }
+    try:
+        socket.send(encode_header(spec), flags=zmq.NOBLOCK)
+        return True
+    except zmq.Again:
+        return False
+
+
+def parse_subscription(data):
+    """Valida y normaliza una suscripción recibida; None si está mal formada."""
+    try:
+        spec = decode_header(data)
+        if not isinstance(spec, dict) or not isinstance(spec.get("source"), str):
+            return None
+        classes, min_conf, top_k = spec.get("classes"), spec.get("min_conf"), spec.get("top_k")
+        return {
+            "source": spec["source"],
+            "classes": None if classes is None else [int(c) for c in classes],
+            "min_conf": None if min_conf is None else float(min_conf),
+            "top_k": None if top_k is None else max(0, int(top_k)),
+        }
+    except (ValueError, TypeError):  # JSON inválido (incluye UnicodeDecodeError) o campos de otro tipo
+        return None
+
+
+def recv_subscriptions(socket, subscriptions):
+    """
+    Aplica sobre el dict `subscriptions` (source -> spec) todas las suscripciones en cola.
+    Los mensajes mal formados se descartan sin tocar las suscripciones vigentes.
+    """
+    try:
+        while True:
+            spec = parse_subscription(socket.recv(flags=zmq.NOBLOCK))
+            if spec is None:
+                print("[WARN] Suscripción mal formada descartada")
+                continue
+            subscriptions[spec["source"]] = spec
+    except zmq.Again:
+        pass
+    return subscriptions
+
+
+def release_frame(header):
+    """
+    Libera el slot de memoria compartida cuando el consumidor ha terminado con el frame.
+    Devuelve False si el frame se sobrescribió mientras se usaba (hay que descartar el resultado).
+    """
+    if header.get("encoding") == ENCODING_SHM:
+        ring = cached_ring(header["shm_name"])
+        if ring is None or ring.nonce != header["shm_nonce"]:
+            return False  # El bloque del que se leyó ya no es el conectado
+        return ring.release(header["slot"], header["seq"])
+    return True
@@ -0,0 +1,179 @@
+"""
+Anillo de frames en memoria compartida para despliegues en la misma máquina
+
+El dron escribe cada frame en un slot del anillo y por ZMQ solo viaja la cabecera
+(nombre del bloque, nonce, slot y número de secuencia). El detector lee el frame como una
+vista NumPy sobre la memoria compartida: sin copia, sin JPEG y sin loopback TCP.
+
+Distribución del bloque:
+    [num_slots, slot_bytes, nonce] -> int64 x 3
+    [seq_0 ... seq_n-1]          -> int64, 0 = slot en escritura / vacío
+    [busy_0 ... busy_n-1]        -> int64, 1 = slot en uso por el lector
+    [slot_0 | slot_1 | ...]      -> datos, alineados a 64 bytes
+
+Sincronización tipo seqlock (sin bloqueos entre procesos):
+    - Escritor: pone seq = 0, vuelve a mirar busy y solo entonces copia; si el
+      lector reclamó el slot entretanto, restaura seq y prueba el siguiente.
+    - Lector: pone busy = 1 y comprueba seq al leer (read) y de nuevo al terminar
+      (release). Si seq cambió, el frame pudo sobrescribirse durante su uso y el
+      resultado debe descartarse.
+
+El nonce es aleatorio en cada create(): si el productor se reinicia, el bloque se
+recrea con el mismo nombre y el consumidor, que aún tiene mapeado el anterior (ya
+borrado), lo detecta al no coincidir con el de la cabecera y se vuelve a conectar.
+"""
+
+import os
+from multiprocessing import shared_memory, resource_tracker
+
+import numpy as np
+
+ALIGN = 64
+META = 3 * 8    # num_slots, slot_bytes, nonce
+
+
+def _aligned(n):
+    return (n + ALIGN - 1) // ALIGN * ALIGN
+
+
+class SharedFrameRing:
+    def __init__(self, shm, owner):
+        self.shm = shm
+        self.owner = owner
+
+        meta = np.ndarray((3,), dtype=np.int64, buffer=shm.buf)
+        self.num_slots = int(meta[0])
+        self.slot_bytes = int(meta[1])
+        self.nonce = int(meta[2])
+        del meta
+
+        self._seqs = np.ndarray((self.num_slots,), dtype=np.int64, buffer=shm.buf, offset=META)
+        self._busy = np.ndarray((self.num_slots,), dtype=np.int64, buffer=shm.buf,
+                                offset=META + 8 * self.num_slots)
+        self._data_offset = _aligned(META + 16 * self.num_slots)
+
+        self._next_slot = 0
+        self._counter = int(self._seqs.max()) if self.num_slots else 0
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    @classmethod
+    def create(cls, name, num_slots, slot_bytes):
+        """Crea el anillo (lado productor). Si quedó uno huérfano con ese nombre, lo sustituye."""
+        slot_bytes = _aligned(slot_bytes)
+        size = _aligned(META + 16 * num_slots) + num_slots * slot_bytes
+        try:
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+
+        header = np.ndarray((3 + 2 * num_slots,), dtype=np.int64, buffer=shm.buf)
+        header[:] = 0
+        header[0] = num_slots
+        header[1] = slot_bytes
+        header[2] = int.from_bytes(os.urandom(8), "little") >> 1  # Nonce de esta creación (> 0)
+        del header
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name):
+        """Se conecta a un anillo existente (lado consumidor)."""
+        shm = shared_memory.SharedMemory(name=name)
+        # En POSIX el resource_tracker borraría el bloque al salir el consumidor
+        try:
+            resource_tracker.unregister(shm._name, "shared_memory")
+        except Exception:
+            pass
+        return cls(shm, owner=False)
+
+    def _slot_view(self, slot, shape, dtype):
+        return np.ndarray(shape, dtype=dtype, buffer=self.shm.buf,
+                          offset=self._data_offset + slot * self.slot_bytes)
+
+    def write(self, frame):
+        """
+        Copia el frame en el siguiente slot libre y devuelve (slot, seq).
+        Los slots que el lector tiene en uso se saltan.
+        """
+        if frame.nbytes > self.slot_bytes:
+            raise ValueError(f"Frame de {frame.nbytes} bytes no cabe en slots de {self.slot_bytes}")
+
+        for _ in range(self.num_slots):
+            slot = self._next_slot
+            self._next_slot = (slot + 1) % self.num_slots
+            if self._busy[slot]:
+                continue
+            previous = int(self._seqs[slot])
+            self._seqs[slot] = 0  # Marcar como "en escritura" antes de volver a mirar busy
+            if not self._busy[slot]:
+                break
+            # El lector lo reclamó entre las dos comprobaciones: se le deja intacto
+            self._seqs[slot] = previous
+        else:
+            return None
+
+        np.copyto(self._slot_view(slot, frame.shape, frame.dtype), frame)
+        self._counter += 1
+        self._seqs[slot] = self._counter
+        return slot, self._counter
+
+    def read(self, slot, seq, shape, dtype):
+        """
+        Devuelve una vista (sin copia) del slot y lo marca como ocupado hasta release().
+        None si el productor ya lo ha sobrescrito.
+        """
+        self._busy[slot] = 1
+        if self._seqs[slot] != seq:
+            self._busy[slot] = 0
+            return None
+        view = self._slot_view(slot, shape, dtype)
+        view.flags.writeable = False
+        return view
+
+    def release(self, slot, seq):
+        """
+        Libera el slot. Devuelve False si el productor lo sobrescribió mientras
+        estaba en uso (el frame leído no es fiable).
+        """
+        valid = self._seqs[slot] == seq
+        self._busy[slot] = 0
+        return bool(valid)
+
+    def close(self):
+        self._seqs = self._busy = None
+        try:
+            self.shm.close()
+        except BufferError:
+            # Aún hay vistas vivas: el SO liberará la memoria al terminar el proceso
+            pass
+        if self.owner:
+            self.shm.unlink()
+
+
+_attached = {}
+
+
+def attach_cached(name, nonce=None):
+    """
+    Anillo conectado por nombre, reutilizado entre frames. Si su nonce no es `nonce`
+    (el productor recreó el bloque), se cierra y se conecta de nuevo. El anillo
+    devuelto puede seguir sin coincidir si la cabecera es de un bloque ya sustituido.
+    """
+    ring = _attached.get(name)
+    if ring is not None and nonce is not None and ring.nonce != nonce:
+        ring.close()
+        ring = None
+    if ring is None:
+        ring = SharedFrameRing.attach(name)
+        _attached[name] = ring
+    return ring
+
+
+def cached_ring(name):
+    """Anillo ya conectado con ese nombre, o None (no conecta)."""
+    return _attached.get(name)
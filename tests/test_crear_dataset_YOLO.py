@@ -0,0 +1,64 @@
+"""
+Conversión a YOLO con procesos arrancados por spawn (el método por defecto en Windows)
+"""
+
+import json
+import multiprocessing
+import sys
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src" / "pruebas"))
+import crear_dataset_YOLO as converter
+
+COLOR_TO_CLASS = {(0, 0, 0): 0, (255, 0, 0): 1, (0, 255, 0): 2}
+
+
+def make_dataset(root, count=4):
+    images, masks = root / "orig", root / "masks"
+    images.mkdir()
+    masks.mkdir()
+    for i in range(count):
+        cv2.imwrite(str(images / f"{i:03d}.jpg"), np.full((120, 160, 3), 90, dtype=np.uint8))
+        mask = np.zeros((120, 160, 3), dtype=np.uint8)
+        mask[10:50, 20:70] = (0, 0, 255)     # Clase 1 (RGB 255,0,0 en BGR)
+        mask[70:110, 90:150] = (0, 255, 0)   # Clase 2
+        cv2.imwrite(str(masks / f"{i:03d}.png"), mask)
+    return images, masks
+
+
+def test_spawn_workers_use_caller_settings(tmp_path, monkeypatch):
+    images, masks = make_dataset(tmp_path)
+    output = tmp_path / "out"
+    converter.create_folders(str(output))
+
+    # Cambios del llamador sobre los globales: deben llegar a procesos que reimportan el módulo
+    monkeypatch.setattr(converter, "MODO", "segmentation")
+    monkeypatch.setattr(converter, "STAGING", "copy")
+
+    success = converter.convert_dataset(COLOR_TO_CLASS, images_dir=str(images), masks_dir=str(masks),
+                                        output_path=str(output), workers=2,
+                                        mp_context=multiprocessing.get_context("spawn"))
+    assert success == {"train": 3, "val": 1}
+
+    # Polígonos (más de 4 coordenadas por línea), no cajas de detección
+    for label_file in (output / "labels" / "train").glob("*.txt"):
+        for line in label_file.read_text().splitlines():
+            assert len(line.split()) > 5
+
+    # Copias, no enlaces duros
+    image = output / "images" / "train" / "000.jpg"
+    assert image.stat().st_nlink == 1
+
+    entries = [json.loads(line) for line in (output / converter.MANIFEST_FILE).read_text().splitlines()]
+    assert {entry["mode"] for entry in entries} == {"segmentation"}
+
+    # Reanudación con el mismo modo: no queda nada por hacer y el índice no cambia
+    index = converter.load_index("train", str(output))
+    assert converter.class_histogram(index, 3).tolist() == [3, 3, 3]
+    converter.convert_dataset(COLOR_TO_CLASS, images_dir=str(images), masks_dir=str(masks),
+                              output_path=str(output), workers=2,
+                              mp_context=multiprocessing.get_context("spawn"))
+    assert len((output / converter.MANIFEST_FILE).read_text().splitlines()) == len(entries)
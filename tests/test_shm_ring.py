@@ -0,0 +1,57 @@
+"""
+Anillo de memoria compartida: reinicio del productor con el consumidor en marcha
+"""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src" / "utils"))
+from frame_protocol import decode_frame, decode_header, release_frame, send_shm_frame
+from shm_ring import SharedFrameRing
+
+SHM_NAME = "test_dron_frames"
+
+
+class CaptureSocket:
+    """Socket falso: guarda las cabeceras enviadas por send_shm_frame."""
+
+    def __init__(self):
+        self.headers = []
+
+    def send_multipart(self, parts, flags=0, copy=True):
+        self.headers.append(decode_header(parts[0]))
+
+
+def publish(ring, value, frame_id):
+    socket = CaptureSocket()
+    assert send_shm_frame(socket, ring, np.full((4, 6, 3), value, dtype=np.uint8), frame_id)
+    return socket.headers[0]
+
+
+def test_consumer_follows_producer_restart():
+    first = SharedFrameRing.create(SHM_NAME, 4, 4 * 6 * 3)
+    try:
+        for frame_id in range(1, 4):
+            header = publish(first, 10, frame_id)
+            assert decode_frame(header, None)[0, 0, 0] == 10
+            assert release_frame(header)
+        stale = publish(first, 10, 4)
+    finally:
+        first.close()
+
+    # Reinicio: mismo nombre y mismas secuencias 1, 2, 3... en un bloque nuevo
+    second = SharedFrameRing.create(SHM_NAME, 4, 4 * 6 * 3)
+    try:
+        for frame_id in range(1, 4):
+            header = publish(second, 200, frame_id)
+            frame = decode_frame(header, None)
+            assert frame is not None and frame[0, 0, 0] == 200
+            assert release_frame(header)
+
+        # Una cabecera del bloque anterior que llegue tarde se descarta
+        assert decode_frame(stale, None) is None
+        assert not release_frame(stale)
+    finally:
+        second.close()